@@ -16,6 +16,8 @@ import random
 import numpy as np
 from nba_api.stats.endpoints import leaguegamelog
 
+from data_loader import add_iso_dates, migrate_iso_dates
+
 # CONFIG
 DB_NAME = "nba_stats.db"
 SEASONS = [
@@ -90,6 +92,11 @@ def fetch_season(season_str, conn):
             # Compute advanced metrics
             df = compute_advanced_metrics(df)
             
+            # Sortable ISO date alongside the API's 'Apr 17, 2026' strings;
+            # older DBs get the column first (no-op once migrated)
+            df = add_iso_dates(df)
+            migrate_iso_dates(conn)
+            
             # Checkpoint: commit to DB
             df.to_sql('player_logs', conn, if_exists='append', index=False)
             conn.commit()
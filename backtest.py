@@ -0,0 +1,275 @@
+"""
+backtest.py — Vectorized historical backtest of the current model.
+
+Rebuilds the point-in-time input of every game in a date range from the
+stored team-game feature table (feature_store.py): a team's window for a
+game is its previous 10 team-games, whose box scores, schedule and pre-game
+Elo context were all known before tip-off. The stored missing_starter_minutes
+is not: it picks starters and their minutes from full-season averages, so it
+would leak the rest of each season into every window. The backtest recomputes
+it point-in-time (starters from each team-season's games before the game
+date, see build_sequences.prior_starters), as inference sees it. The model
+itself was trained on the stored, season-wide feature.
+
+Windows are gathered from one contiguous feature matrix and scored in large
+batches; home and away probabilities are normalized per game as in
+predict_tonight.py.
+
+Reports accuracy, log loss, Brier score, AUC and expected calibration error
+by season and by month, plus an overall reliability table.
+
+The current model was trained on the leading TRAIN_FRACTION of the windows of
+an earlier team-game table, cut in sequence_index order: by team, then date,
+so the split holds out whole teams rather than the latest games, and it
+moves as games are appended. build_sequences.py records the target game of
+every training window in models/training_split.csv, next to the scaler; a game
+is flagged in_sample when either team's window targets one of them. summary.csv
+reports the in-sample share of every group and separate in-sample /
+out-of-sample rows, and a warning is printed when the requested range overlaps
+the training split (or when no split is recorded, in which case every game is
+treated as in-sample).
+
+Output (in backtest/):
+    games.csv        one row per game: teams, date, home win prob, outcome, in_sample
+    summary.csv      metrics per season, month and split, with the in-sample share
+    calibration.csv  predicted vs observed home win rate per probability bin
+
+Usage:
+    python backtest.py                                  # every stored game
+    python backtest.py --season 2025-26
+    python backtest.py --start 2026-01-01 --end 2026-02-28
+"""
+
+import pandas as pd
+import sqlite3
+import numpy as np
+import os
+import time
+import joblib
+import argparse
+
+from build_sequences import (
+    LOOKBACK, TRAINING_SPLIT_FILE, add_missing_starter_minutes,
+    sequence_index, sequence_order, sliding_windows
+)
+from data_loader import STARTER_LOG_COLUMNS, load_player_logs
+from feature_store import load_team_games
+from predict_tonight import DB_NAME, MODELS_DIR, WEIGHTS_FILE, load_inference_model, predict_batch
+
+# CONFIG
+BACKTEST_DIR = "backtest"
+BATCH_SIZE = 4096
+CALIBRATION_BINS = 10
+EPS = 1e-7  # Probability clip for log loss
+
+
+def season_id(season):
+    """SEASON_ID ('22025') from '2025-26', '2025' or '22025'."""
+    season = str(season).split('-')[0]
+    return season if len(season) == 5 else '2' + season
+
+
+def point_in_time_windows(team_games, lookback=LOOKBACK):
+    """
+    Index every window of the team-game table together with the game it
+    predicts. Returns (feature_matrix, starts, targets) where targets holds
+    Game_ID, TEAM_ABBR, is_home, game_date, season_id and win of the game
+    following each window.
+    """
+    team_games = team_games.iloc[sequence_order(team_games)].reset_index(drop=True)
+    feature_matrix, starts, _ = sequence_index(team_games, lookback)
+    targets = team_games.loc[
+        starts + lookback, ['Game_ID', 'TEAM_ABBR', 'is_home', 'game_date', 'season_id', 'win']
+    ].reset_index(drop=True)
+    return feature_matrix, starts, targets
+
+
+def point_in_time_team_games(conn, team_games):
+    """
+    Copy of the stored team-game table with missing_starter_minutes recomputed
+    from each team-season's games before the game date (no season-wide leak).
+    """
+    player_logs = load_player_logs(conn, STARTER_LOG_COLUMNS + ['GAME_DATE'])
+    return add_missing_starter_minutes(team_games.copy(), player_logs, point_in_time=True)
+
+
+def load_training_split(path=os.path.join(MODELS_DIR, TRAINING_SPLIT_FILE)):
+    """(Game_ID, TEAM_ABBR) targets of the model's training windows, or None if not recorded."""
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path, dtype=str)
+
+
+def in_sample_mask(targets, trained):
+    """Mask of the targets whose (Game_ID, TEAM_ABBR) was a training window's target."""
+    keys = pd.MultiIndex.from_frame(targets[['Game_ID', 'TEAM_ABBR']].astype(str))
+    return keys.isin(pd.MultiIndex.from_frame(trained[['Game_ID', 'TEAM_ABBR']]))
+
+
+def score_windows(model, scaler, feature_matrix, starts, batch_size=BATCH_SIZE, lookback=LOOKBACK):
+    """Raw model probabilities for windows[starts], materializing one batch at a time."""
+    windows = sliding_windows(feature_matrix, lookback)
+    return np.concatenate([
+        predict_batch(model, scaler, windows[starts[i:i + batch_size]])
+        for i in range(0, len(starts), batch_size)
+    ]) if len(starts) else np.empty(0)
+
+
+def pair_games(targets, raw_probs):
+    """
+    One row per game with both teams scored: the home team's normalized win
+    probability (home_raw / (home_raw + away_raw)) and whether it won. With an
+    `in_sample` column in targets, a game is in-sample if either window is.
+    """
+    scored = targets.assign(raw_prob=raw_probs)
+    carried = ['Game_ID', 'TEAM_ABBR', 'raw_prob'] + (['in_sample'] if 'in_sample' in targets else [])
+    home = scored[scored['is_home'] == 1]
+    away = scored[scored['is_home'] == 0][carried]
+    games = home.merge(away, on='Game_ID', suffixes=('', '_away'))
+    
+    total = games['raw_prob'] + games['raw_prob_away']
+    games['home_win_prob'] = np.where(total > 0, games['raw_prob'] / total.where(total > 0, 1), 0.5)
+    columns = ['Game_ID', 'season_id', 'game_date', 'home_team', 'away_team', 'home_win_prob', 'home_win']
+    if 'in_sample' in targets:
+        games['in_sample'] = games['in_sample'] | games['in_sample_away']
+        columns.append('in_sample')
+    return games.rename(columns={
+        'TEAM_ABBR': 'home_team', 'TEAM_ABBR_away': 'away_team', 'win': 'home_win',
+    })[columns]
+
+
+def roc_auc(y, p):
+    """Rank-based (Mann-Whitney) AUC; NaN when only one class is present."""
+    n_pos = int(y.sum())
+    n_neg = len(y) - n_pos
+    if n_pos == 0 or n_neg == 0:
+        return np.nan
+    ranks = pd.Series(p).rank().to_numpy()
+    return (ranks[y == 1].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg)
+
+
+def calibration_bins(y, p, bins=CALIBRATION_BINS):
+    """Per probability bin: games, mean predicted and observed home win rate."""
+    edges = np.linspace(0, 1, bins + 1)
+    idx = np.clip(np.digitize(p, edges[1:-1]), 0, bins - 1)
+    table = pd.DataFrame({'bin': idx, 'p': p, 'y': y}).groupby('bin').agg(
+        games=('y', 'size'), mean_pred=('p', 'mean'), observed=('y', 'mean')
+    )
+    table.insert(0, 'range', [f"{edges[b]:.1f}-{edges[b + 1]:.1f}" for b in table.index])
+    return table.reset_index(drop=True)
+
+
+def metrics(y, p):
+    """Accuracy, log loss, Brier, AUC and expected calibration error."""
+    y = np.asarray(y, dtype=np.float64)
+    p = np.asarray(p, dtype=np.float64)
+    clipped = np.clip(p, EPS, 1 - EPS)
+    calib = calibration_bins(y, p)
+    return {
+        'games': len(y),
+        'accuracy': float(((p > 0.5) == (y == 1)).mean()),
+        'log_loss': float(-(y * np.log(clipped) + (1 - y) * np.log(1 - clipped)).mean()),
+        'brier': float(((p - y) ** 2).mean()),
+        'auc': roc_auc(y, p),
+        'ece': float((calib['games'] * (calib['mean_pred'] - calib['observed']).abs()).sum() / len(y)),
+    }
+
+
+def summarize(games):
+    """Metrics overall, per season, per month and per split, with each group's in-sample share."""
+    groups = [('all', games.assign(key='all'))]
+    groups.append(('season', games.assign(key=games['season_id'].astype(str))))
+    groups.append(('month', games.assign(key=games['game_date'].dt.strftime('%Y-%m'))))
+    groups.append(('split', games.assign(
+        key=np.where(games['in_sample'], 'in_sample', 'out_of_sample')
+    )))
+    
+    rows = []
+    for level, frame in groups:
+        for key, group in frame.groupby('key', sort=True):
+            rows.append({'level': level, 'group': key,
+                         'in_sample': float(group['in_sample'].mean()),
+                         **metrics(group['home_win'], group['home_win_prob'])})
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backtest the current model on stored games')
+    parser.add_argument('--season', help="Season to backtest, e.g. 2025-26")
+    parser.add_argument('--start', help='First game date (YYYY-MM-DD)')
+    parser.add_argument('--end', help='Last game date (YYYY-MM-DD)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    
+    print("--- BACKTEST ---")
+    start_time = time.perf_counter()
+    
+    # 1. Model (scaler only when it is not baked into the NumPy export)
+    model = load_inference_model(
+        os.path.join(MODELS_DIR, 'lstm_model.keras'), os.path.join(MODELS_DIR, WEIGHTS_FILE)
+    )
+    scaler = None
+    if not getattr(model, 'scales_inputs', False):
+        scaler = joblib.load(os.path.join(MODELS_DIR, 'scaler.pkl'))
+    
+    # 2. Team-game features and the point-in-time window of every game
+    conn = sqlite3.connect(DB_NAME)
+    team_games = load_team_games(conn)
+    if team_games is None or team_games.empty:
+        conn.close()
+        print("[FAIL] No team_games table. Run feature_store.py first.")
+        return
+    team_games = point_in_time_team_games(conn, team_games)
+    conn.close()
+    
+    feature_matrix, starts, targets = point_in_time_windows(team_games)
+    trained = load_training_split()
+    if trained is None:
+        print(f"  [WARNING] No {TRAINING_SPLIT_FILE} in {MODELS_DIR}/ (rerun build_sequences.py); "
+              f"treating every game as in_sample.")
+        targets['in_sample'] = True
+    else:
+        targets['in_sample'] = in_sample_mask(targets, trained)
+    
+    # 3. Restrict to the requested games before scoring
+    mask = np.ones(len(targets), dtype=bool)
+    if args.season:
+        mask &= (targets['season_id'].astype(str) == season_id(args.season)).to_numpy()
+    if args.start:
+        mask &= (targets['game_date'] >= pd.Timestamp(args.start)).to_numpy()
+    if args.end:
+        mask &= (targets['game_date'] <= pd.Timestamp(args.end)).to_numpy()
+    starts, targets = starts[mask], targets[mask].reset_index(drop=True)
+    
+    if not len(starts):
+        print("[FAIL] No games with a full lookback window in the requested range.")
+        return
+    
+    # 4. Score every window in large batches and pair home/away per game
+    raw_probs = score_windows(model, scaler, feature_matrix, starts, args.batch_size)
+    games = pair_games(targets, raw_probs)
+    print(f"  Scored {len(starts)} windows -> {len(games)} games "
+          f"({games['game_date'].min():%Y-%m-%d} to {games['game_date'].max():%Y-%m-%d}) "
+          f"in {time.perf_counter() - start_time:.2f}s")
+    if games['in_sample'].any():
+        print(f"  [WARNING] {games['in_sample'].sum()} of {len(games)} games overlap the model's "
+              f"training split (in_sample); only out_of_sample metrics are held out.")
+    
+    # 5. Metrics by season and month, and overall calibration
+    summary = summarize(games)
+    calibration = calibration_bins(games['home_win'].to_numpy(), games['home_win_prob'].to_numpy())
+    
+    os.makedirs(BACKTEST_DIR, exist_ok=True)
+    for name, frame in [('games', games), ('summary', summary), ('calibration', calibration)]:
+        path = os.path.join(BACKTEST_DIR, f"{name}.csv")
+        frame.to_csv(path, index=False, float_format='%.4f')
+        print(f"  [SAVED] {path}")
+    
+    print("\n  By season / month:")
+    print(summary.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    print("\n  Calibration (home win probability):")
+    print(calibration.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
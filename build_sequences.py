@@ -14,23 +14,40 @@ Features per timestep (24 total):
     Injury impact (1):    missing_starter_minutes
     Strength (3):         team_elo, opp_win_pct, opp_pts_allowed_avg
 
-Output: X.npy, y.npy, models/scaler.pkl, models/elo_ratings.json, models/game_context.pkl
+Team-game features are persisted in the `team_games` table of nba_stats.db
+(see feature_store.py), so a rebuild only aggregates seasons with new games.
+Pass --full-rebuild to recompute every season.
+
+Output: X.npy, y.npy, models/scaler.pkl, models/training_split.csv,
+        models/elo_ratings.json, models/elo_state.json, game_context table (nba_stats.db)
+
+With --format index the windows are not materialized. dataset/ holds one
+scaled (rows, 24) float32 team-game matrix plus int32 window start offsets
+and labels per split; train_lstm.py --dataset dataset memory-maps them and
+assembles windows batch by batch (about lookback times smaller on disk).
 """
 
 import pandas as pd
 import sqlite3
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import os
 import json
 import joblib
-from sklearn.preprocessing import StandardScaler
-from datetime import timedelta
+import argparse
+
+from data_loader import compact_player_logs
 
 # CONFIG
 DB_NAME = "nba_stats.db"
 LOOKBACK = 10
 MODELS_DIR = "models"
 STARTER_MIN_THRESHOLD = 25  # Minutes per game threshold for "starter"
+DATASET_DIR = "dataset"  # --format index output
+TRAIN_FRACTION = 0.8  # Leading share of windows (sequence_index order) used for training
+TRAINING_SPLIT_FILE = "training_split.csv"  # Target games of the training windows (in MODELS_DIR)
+ELO_STATE_FILE = "elo_state.json"  # Checkpointed Elo engine state (in MODELS_DIR)
+GAME_CONTEXT_TABLE = "game_context"  # Pre-game Elo context per (Game_ID, TEAM_ABBR), in DB_NAME
 
 # The exact order of features — must match inference in predict_tonight.py
 FEATURE_COLUMNS = [
@@ -45,6 +62,32 @@ FEATURE_COLUMNS = [
 
 assert len(FEATURE_COLUMNS) == 24, f"Expected 24 features, got {len(FEATURE_COLUMNS)}"
 
+# Box-score features per team-game as one named aggregation over player logs.
+# Training (aggregate_team_games) and inference (predict_tonight) share it.
+BOX_SCORE_AGGREGATIONS = {
+    # Team sums
+    'team_pts': ('PTS', 'sum'),
+    'team_reb': ('REB', 'sum'),
+    'team_ast': ('AST', 'sum'),
+    'team_stl': ('STL', 'sum'),
+    'team_blk': ('BLK', 'sum'),
+    'team_tov': ('TOV', 'sum'),
+    # Star-absence maxes
+    'max_pts': ('PTS', 'max'),
+    'max_reb': ('REB', 'max'),
+    'max_ast': ('AST', 'max'),
+    # Efficiency (team averages of individual rates)
+    'fg_pct': ('FG_PCT', 'mean'),
+    'fg3_pct': ('FG3_PCT', 'mean'),
+    'ft_pct': ('FT_PCT', 'mean'),
+    'efg_pct': ('EFG_PCT', 'mean'),
+    'ts_pct': ('TS_PCT', 'mean'),
+    'tov_pct': ('TOV_PCT', 'mean'),
+    # Context
+    'plus_minus': ('PLUS_MINUS', 'mean'),
+    'is_home': ('IS_HOME', 'first'),
+}
+
 
 def compute_advanced_metrics(df):
     """Compute eFG%, TS%, TOV% if not already present."""
@@ -70,7 +113,137 @@ def extract_team_from_matchup(matchup):
     return ''
 
 
-def compute_elo_and_strength(team_games):
+def games_in_window(dates, query_dates=None, days=7):
+    """
+    Count games played in the `days` days before each game (sorted-array kernel).
+    
+    `dates` must be sorted ascending. With no `query_dates`, each entry of `dates`
+    is counted against the entries before it (the training definition). Otherwise
+    each query date is located in `dates` with searchsorted and counted against
+    the games before that position (the inference definition).
+    Returns an int64 array, one count per game / query date.
+    """
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    if query_dates is None:
+        query_dates = dates
+        positions = np.arange(len(dates))
+    else:
+        query_dates = np.asarray(query_dates, dtype='datetime64[ns]')
+        positions = np.searchsorted(dates, query_dates, side='left')
+    
+    window_start = query_dates - np.timedelta64(days, 'D')
+    return positions - np.searchsorted(dates, window_start, side='left')
+
+
+def missing_starter_minutes(games, starters, played, starter_keys, played_keys):
+    """
+    Sum the avg_min of starters absent from each game's box score (anti-join).
+    
+    games:    one row per output value, carrying starter_keys and played_keys
+    starters: starter_keys + ['Player_ID', 'avg_min']
+    played:   player appearances, carrying played_keys + ['Player_ID']
+    
+    Each game is exploded to its starter set (a cross join when starter_keys
+    is empty), anti-joined against the played set, and the remaining avg_min
+    summed per game. Starters are summed in Player_ID order from 0.0, the same
+    order as a sequential loop, so results are bit-for-bit reproducible.
+    Returns a float64 array aligned to the row order of `games`.
+    """
+    slots = games[list(dict.fromkeys(starter_keys + played_keys))].reset_index(drop=True)
+    slots['_row'] = np.arange(len(slots))
+    
+    starters = starters[starter_keys + ['Player_ID', 'avg_min']]
+    if starter_keys:
+        pairs = slots.merge(starters, on=starter_keys, how='inner')
+    else:
+        pairs = slots.merge(starters, how='cross')
+    pairs = pairs.sort_values(['_row', 'Player_ID'], kind='stable')
+    
+    played = played[played_keys + ['Player_ID']].drop_duplicates()
+    pairs = pairs.merge(played, on=played_keys + ['Player_ID'], how='left', indicator=True)
+    absent = pairs[pairs['_merge'] == 'left_only']
+    
+    # bincount accumulates weights sequentially in row order
+    return np.bincount(
+        absent['_row'].to_numpy(), weights=absent['avg_min'].to_numpy(dtype=np.float64),
+        minlength=len(slots)
+    )
+
+
+def save_game_context(conn, game_context, replace=False):
+    """
+    Upsert pre-game context rows into the game_context table (primary key
+    Game_ID, TEAM_ABBR). With replace, existing rows are dropped first; when
+    the table is new and models/game_context.pkl exists (DBs built before the
+    table), its entries are imported before the upsert.
+    Returns the number of rows in the table.
+    """
+    is_new = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (GAME_CONTEXT_TABLE,)
+    ).fetchone() is None
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {GAME_CONTEXT_TABLE} ("
+        "Game_ID TEXT NOT NULL, TEAM_ABBR TEXT NOT NULL, "
+        "team_elo REAL, opp_win_pct REAL, opp_pts_allowed_avg REAL, "
+        "PRIMARY KEY (Game_ID, TEAM_ABBR))"
+    )
+    
+    insert = f"INSERT OR REPLACE INTO {GAME_CONTEXT_TABLE} VALUES (?, ?, ?, ?, ?)"
+    legacy_path = os.path.join(MODELS_DIR, 'game_context.pkl')
+    if replace:
+        conn.execute(f"DELETE FROM {GAME_CONTEXT_TABLE}")
+    elif is_new and os.path.exists(legacy_path):
+        conn.executemany(insert, (
+            (gid, team, ctx['team_elo'], ctx['opp_win_pct'], ctx.get('opp_pts_allowed_avg', 105.0))
+            for (gid, team), ctx in joblib.load(legacy_path).items()
+        ))
+    
+    conn.executemany(insert, game_context[
+        ['Game_ID', 'TEAM_ABBR', 'team_elo', 'opp_win_pct', 'opp_pts_allowed_avg']
+    ].itertuples(index=False, name=None))
+    conn.commit()
+    return conn.execute(f"SELECT COUNT(*) FROM {GAME_CONTEXT_TABLE}").fetchone()[0]
+
+
+def load_game_context(conn, game_ids):
+    """
+    Pre-game context for the given Game_IDs, read through the table's primary
+    key: {(Game_ID, TEAM_ABBR): {'team_elo', 'opp_win_pct', 'opp_pts_allowed_avg'}}.
+    Falls back to models/game_context.pkl when the DB has no game_context table.
+    """
+    game_ids = [str(g) for g in game_ids]
+    has_table = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (GAME_CONTEXT_TABLE,)
+    ).fetchone() is not None
+    
+    if has_table:
+        placeholders = ','.join('?' for _ in game_ids)
+        rows = conn.execute(
+            f"SELECT Game_ID, TEAM_ABBR, team_elo, opp_win_pct, opp_pts_allowed_avg "
+            f"FROM {GAME_CONTEXT_TABLE} WHERE Game_ID IN ({placeholders})", game_ids
+        ).fetchall()
+        return {
+            (gid, team): {'team_elo': e, 'opp_win_pct': wp, 'opp_pts_allowed_avg': opp_def}
+            for gid, team, e, wp, opp_def in rows
+        }
+    
+    legacy_path = os.path.join(MODELS_DIR, 'game_context.pkl')
+    if os.path.exists(legacy_path):
+        wanted = set(game_ids)
+        return {k: v for k, v in joblib.load(legacy_path).items() if k[0] in wanted}
+    return {}
+
+
+def load_elo_state(path=None):
+    """Load the checkpointed Elo engine state, or None if there is none."""
+    path = path or os.path.join(MODELS_DIR, ELO_STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def compute_elo_and_strength(team_games, state=None, conn=None):
     """
     Compute rolling Elo ratings, opponent win%, and opponent defensive rating
     for each team-game.
@@ -79,110 +252,180 @@ def compute_elo_and_strength(team_games):
     Opp Win%: The opponent's season record going into each game.
     Opp Pts Allowed Avg: Opponent's season average points allowed per game.
     
+    Teams and games are integer-coded once; the sequential recurrence runs over
+    contiguous arrays (team A/B row positions per game, preallocated outputs)
+    and the results are scattered back to the rows by position.
+    
+    The full engine state (ratings, season counters, current season and the
+    last processed game) is checkpointed to models/elo_state.json. Given a
+    `state` from load_elo_state(), the recurrence resumes from it: only games
+    after the checkpoint are processed, rows of earlier games keep the values
+    already in team_games, and new entries are upserted into the game_context
+    table (written through `conn`, or a connection to DB_NAME).
+    
     Adds 'team_elo', 'opp_win_pct', and 'opp_pts_allowed_avg' columns.
     Returns (team_games, current_elo_dict).
     """
     K = 20
     SEASON_CARRY = 0.75  # How much Elo carries over between seasons
     
-    elo = {}              # team_abbr -> current Elo rating
-    season_wins = {}      # team_abbr -> wins this season
-    season_games = {}     # team_abbr -> games played this season
-    season_pts_allowed = {}  # team_abbr -> total points allowed this season
-    current_season = None
-    
-    # Get chronological order of unique Game_IDs
-    game_order = (
-        team_games.drop_duplicates('Game_ID')
-        .sort_values('game_date')['Game_ID']
-        .values
+    # Integer-code teams (checkpointed teams first, in their original order) and games
+    state_teams = list(state['teams']) if state else []
+    team_names = pd.Index(state_teams).append(
+        pd.Index(team_games['TEAM_ABBR'].unique()).difference(state_teams, sort=False)
     )
+    team_codes = team_names.get_indexer(team_games['TEAM_ABBR'])
+    game_codes, game_ids = pd.factorize(team_games['Game_ID'])
+    n_teams, n_games = len(team_names), len(game_ids)
+    
+    # Row positions of each game's two team-games (team A = first row in frame order)
+    rows_by_game = np.argsort(game_codes, kind='stable')
+    rows_per_game = np.bincount(game_codes, minlength=n_games)
+    first_row = np.concatenate(([0], np.cumsum(rows_per_game)[:-1]))
+    is_pair = rows_per_game == 2
+    pos_a = rows_by_game[first_row]
+    pos_b = rows_by_game[np.where(is_pair, first_row + 1, first_row)]
+    
+    # Chronological order of unique Game_IDs, as game codes
+    game_order = game_ids.get_indexer(
+        team_games.drop_duplicates('Game_ID').sort_values('game_date')['Game_ID']
+    )
+    game_order = game_order[is_pair[game_order]]
+    
+    # Per-game inputs, gathered once
+    season = team_games['season_id'].astype(str).to_numpy()[pos_a]
+    game_date = team_games['game_date'].to_numpy()[pos_a]
+    win = team_games['win'].to_numpy(dtype=np.float64)
+    pts = team_games['team_pts'].to_numpy(dtype=np.float64)
+    team_a, team_b = team_codes[pos_a], team_codes[pos_b]
+    win_a = win[pos_a]
+    pts_a, pts_b = pts[pos_a], pts[pos_b]
+    
+    # Engine state, indexed by team code
+    elo = np.full(n_teams, 1500.0)
+    season_wins = np.zeros(n_teams)
+    season_games = np.zeros(n_teams)
+    season_pts_allowed = np.zeros(n_teams)
+    seen = np.zeros(n_teams, dtype=bool)
+    seen_order = []                   # team codes in order of first appearance
+    current_season = None
     
-    # Group by Game_ID for fast lookup
-    game_groups = team_games.groupby('Game_ID')
+    if state:
+        for t, team in enumerate(state_teams):
+            ts = state['teams'][team]
+            elo[t] = ts['elo']
+            season_wins[t] = ts['season_wins']
+            season_games[t] = ts['season_games']
+            season_pts_allowed[t] = ts['season_pts_allowed']
+        seen[:len(state_teams)] = True
+        seen_order = list(range(len(state_teams)))
+        current_season = state['current_season']
+        
+        # Resume after the checkpoint: later dates, or unprocessed games on its date
+        last_date = np.datetime64(pd.Timestamp(state['last_game_date']))
+        order_dates = game_date[game_order]
+        done_on_last = np.isin(game_ids[game_order], state['last_date_game_ids'])
+        game_order = game_order[
+            (order_dates > last_date) | ((order_dates == last_date) & ~done_on_last)
+        ]
     
-    # Storage: (Game_ID, TEAM_ABBR) -> pre-game value
-    game_elo = {}
-    game_opp_wp = {}
-    game_opp_def = {}   # (Game_ID, TEAM_ABBR) -> opponent's avg pts allowed
+    # Pre-game outputs per game, for team A and team B
+    elo_a, elo_b = np.empty(n_games), np.empty(n_games)
+    opp_wp_a, opp_wp_b = np.empty(n_games), np.empty(n_games)
+    opp_def_a, opp_def_b = np.empty(n_games), np.empty(n_games)
     
-    for gid in game_order:
-        group = game_groups.get_group(gid)
-        if len(group) != 2:
-            continue
-        
-        row_a, row_b = group.iloc[0], group.iloc[1]
-        team_a = row_a['TEAM_ABBR']
-        team_b = row_b['TEAM_ABBR']
-        season = row_a['season_id']
-        win_a = float(row_a['win'])
+    for g in game_order.tolist():
+        a, b = int(team_a[g]), int(team_b[g])
         
         # Season reset: regress Elo toward 1500
-        if season != current_season:
-            current_season = season
-            for t in list(elo.keys()):
-                elo[t] = SEASON_CARRY * elo[t] + (1 - SEASON_CARRY) * 1500
-            season_wins.clear()
-            season_games.clear()
-            season_pts_allowed.clear()
-        
-        # Initialize new teams
-        for t in [team_a, team_b]:
-            elo.setdefault(t, 1500)
-            season_wins.setdefault(t, 0)
-            season_games.setdefault(t, 0)
-            season_pts_allowed.setdefault(t, 0.0)
+        if season[g] != current_season:
+            current_season = season[g]
+            elo[seen] = SEASON_CARRY * elo[seen] + (1 - SEASON_CARRY) * 1500
+            season_wins[:] = 0
+            season_games[:] = 0
+            season_pts_allowed[:] = 0.0
         
-        # Store pre-game Elo
-        game_elo[(gid, team_a)] = elo[team_a]
-        game_elo[(gid, team_b)] = elo[team_b]
+        for t in (a, b):
+            if not seen[t]:
+                seen[t] = True
+                seen_order.append(t)
         
-        # Store opponent's pre-game season win%
-        game_opp_wp[(gid, team_a)] = season_wins[team_b] / max(season_games[team_b], 1)
-        game_opp_wp[(gid, team_b)] = season_wins[team_a] / max(season_games[team_a], 1)
+        rating_a, rating_b = float(elo[a]), float(elo[b])
+        games_a, games_b = max(season_games[a], 1), max(season_games[b], 1)
         
-        # Store opponent's pre-game avg points allowed
-        game_opp_def[(gid, team_a)] = season_pts_allowed[team_b] / max(season_games[team_b], 1)
-        game_opp_def[(gid, team_b)] = season_pts_allowed[team_a] / max(season_games[team_a], 1)
+        # Store pre-game Elo, opponent win% and opponent avg points allowed
+        elo_a[g], elo_b[g] = rating_a, rating_b
+        opp_wp_a[g] = season_wins[b] / games_b
+        opp_wp_b[g] = season_wins[a] / games_a
+        opp_def_a[g] = season_pts_allowed[b] / games_b
+        opp_def_b[g] = season_pts_allowed[a] / games_a
         
         # Update Elo
-        e_a = 1 / (1 + 10 ** ((elo[team_b] - elo[team_a]) / 400))
-        elo[team_a] += K * (win_a - e_a)
-        elo[team_b] += K * ((1 - win_a) - (1 - e_a))
+        w = float(win_a[g])
+        e_a = 1 / (1 + 10 ** ((rating_b - rating_a) / 400))
+        elo[a] = rating_a + K * (w - e_a)
+        elo[b] = rating_b + K * ((1 - w) - (1 - e_a))
         
-        # Update season records
-        season_games[team_a] += 1
-        season_games[team_b] += 1
-        if win_a:
-            season_wins[team_a] += 1
+        # Update season records and points allowed
+        season_games[a] += 1
+        season_games[b] += 1
+        if w:
+            season_wins[a] += 1
         else:
-            season_wins[team_b] += 1
-        
-        # Update points allowed (team_a allowed team_b's score, and vice versa)
-        pts_a = float(row_a['team_pts'])  # points scored by team_a
-        pts_b = float(row_b['team_pts'])  # points scored by team_b
-        season_pts_allowed[team_a] += pts_b  # team_a allowed team_b's points
-        season_pts_allowed[team_b] += pts_a  # team_b allowed team_a's points
-    
-    # Map back to team_games DataFrame
-    team_games['team_elo'] = team_games.apply(
-        lambda r: game_elo.get((r['Game_ID'], r['TEAM_ABBR']), 1500), axis=1
-    )
-    team_games['opp_win_pct'] = team_games.apply(
-        lambda r: game_opp_wp.get((r['Game_ID'], r['TEAM_ABBR']), 0.5), axis=1
-    )
-    team_games['opp_pts_allowed_avg'] = team_games.apply(
-        lambda r: game_opp_def.get((r['Game_ID'], r['TEAM_ABBR']), 105.0), axis=1
-    )
-    
-    # Build game_context for inference lookback
-    game_context = {}
-    for (gid, team), e in game_elo.items():
-        game_context[(gid, team)] = {
-            'team_elo': float(e),
-            'opp_win_pct': float(game_opp_wp.get((gid, team), 0.5)),
-            'opp_pts_allowed_avg': float(game_opp_def.get((gid, team), 105.0))
+            season_wins[b] += 1
+        season_pts_allowed[a] += pts_b[g]
+        season_pts_allowed[b] += pts_a[g]
+    
+    # Scatter pre-game values back to team_games rows; when resuming, rows of
+    # already-processed games keep their existing values
+    rows_a, rows_b = pos_a[game_order], pos_b[game_order]
+    for col, default, out_a, out_b in [
+        ('team_elo', 1500.0, elo_a, elo_b),
+        ('opp_win_pct', 0.5, opp_wp_a, opp_wp_b),
+        ('opp_pts_allowed_avg', 105.0, opp_def_a, opp_def_b),
+    ]:
+        if state and col in team_games:
+            values = team_games[col].fillna(default).to_numpy(dtype=np.float64, copy=True)
+        else:
+            values = np.full(len(team_games), default)
+        values[rows_a] = out_a[game_order]
+        values[rows_b] = out_b[game_order]
+        team_games[col] = values
+    
+    # Pre-game context per (Game_ID, TEAM_ABBR) for inference lookback
+    game_context = pd.DataFrame({
+        'Game_ID': np.tile(np.asarray(game_ids)[game_order], 2),
+        'TEAM_ABBR': np.asarray(team_names)[team_codes[np.concatenate([rows_a, rows_b])]],
+        'team_elo': np.concatenate([elo_a[game_order], elo_b[game_order]]),
+        'opp_win_pct': np.concatenate([opp_wp_a[game_order], opp_wp_b[game_order]]),
+        'opp_pts_allowed_avg': np.concatenate([opp_def_a[game_order], opp_def_b[game_order]]),
+    })
+    
+    # Checkpoint the engine state after the last processed game
+    checkpoint = {
+        'current_season': current_season,
+        'last_game_date': state['last_game_date'] if state else None,
+        'last_date_game_ids': state['last_date_game_ids'] if state else [],
+    }
+    if len(game_order):
+        last_date = game_date[game_order[-1]]
+        last_ids = game_ids[game_order[game_date[game_order] == last_date]].tolist()
+        if checkpoint['last_game_date'] and \
+                np.datetime64(pd.Timestamp(checkpoint['last_game_date'])) == last_date:
+            last_ids = checkpoint['last_date_game_ids'] + last_ids
+        checkpoint['last_game_date'] = str(pd.Timestamp(last_date))
+        checkpoint['last_date_game_ids'] = last_ids
+    checkpoint['teams'] = {
+        team_names[t]: {
+            'elo': float(elo[t]),
+            'season_wins': int(season_wins[t]),
+            'season_games': int(season_games[t]),
+            'season_pts_allowed': float(season_pts_allowed[t]),
         }
+        for t in seen_order
+    }
+    
+    elo = {team_names[t]: float(elo[t]) for t in seen_order}
     
     # Save context files
     os.makedirs(MODELS_DIR, exist_ok=True)
@@ -191,65 +434,165 @@ def compute_elo_and_strength(team_games):
     with open(elo_path, 'w') as f:
         json.dump({k: round(v, 1) for k, v in elo.items()}, f, indent=2)
     
-    context_path = os.path.join(MODELS_DIR, 'game_context.pkl')
-    joblib.dump(game_context, context_path)
-    
-    print(f"    Elo range: [{min(elo.values()):.0f}, {max(elo.values()):.0f}]")
+    # Resuming appends (upserts) the new games' rows; otherwise the table is rebuilt
+    context_conn = conn if conn is not None else sqlite3.connect(DB_NAME)
+    context_rows = save_game_context(context_conn, game_context, replace=not state)
+    if conn is None:
+        context_conn.close()
+    if state:
+        print(f"    Resumed from checkpoint: {len(game_order)} new games, "
+              f"{len(game_context)} context entries appended")
+    
+    state_path = os.path.join(MODELS_DIR, ELO_STATE_FILE)
+    with open(state_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    
+    if elo:
+        print(f"    Elo range: [{min(elo.values()):.0f}, {max(elo.values()):.0f}]")
     print(f"    [SAVED] {elo_path} ({len(elo)} teams)")
-    print(f"    [SAVED] {context_path} ({len(game_context)} game-team pairs)")
+    print(f"    [SAVED] {GAME_CONTEXT_TABLE} table ({context_rows} game-team pairs)")
+    print(f"    [SAVED] {state_path} (last game {checkpoint['last_game_date']})")
     
     return team_games, elo
 
 
-def build_team_game_features(player_logs):
+def aggregate_box_scores(player_logs, keys, **extra):
     """
-    Aggregate player-level logs into team-game-level features.
-    Returns a DataFrame with one row per team-game.
+    Reduce player logs to BOX_SCORE_AGGREGATIONS per group of `keys` in a
+    single groupby. `extra` adds named aggregations (e.g. game_date).
     """
-    print("  Aggregating player stats to team-game level...")
+    return player_logs.groupby(keys, observed=True).agg(
+        **BOX_SCORE_AGGREGATIONS, **extra
+    )
+
+
+def prepare_player_logs(player_logs):
+    """Fill NaN stats and ensure advanced metrics exist on raw player logs."""
+    # API returns NaN for stats like FT_PCT when 0 FTA
+    nan_count = player_logs.isna().sum().sum()
+    if nan_count > 0:
+        print(f"  Filling {nan_count} NaN values in raw data...")
+        numeric_cols = player_logs.select_dtypes(include=[np.number]).columns
+        player_logs[numeric_cols] = player_logs[numeric_cols].fillna(0)
+    
+    return compute_advanced_metrics(player_logs)
+
+
+def prior_starters(team_games, player_logs):
+    """
+    Point-in-time starters of each team-game: the players of its team-season
+    whose average minutes over that team-season's games before the game date
+    reach STARTER_MIN_THRESHOLD. Returns Game_ID, TEAM_ABBR, Player_ID and
+    avg_min (the average over those earlier games).
+    """
+    keys = ['TEAM_ABBR', 'season_id', 'Player_ID']
+    logs = pd.DataFrame({
+        'TEAM_ABBR': player_logs['TEAM_ABBR'].astype(str),
+        'season_id': player_logs['SEASON_ID'].astype(str),
+        'Player_ID': player_logs['Player_ID'].to_numpy(),
+        'game_date': player_logs['GAME_DATE_DT'].astype('datetime64[ns]'),
+        'minutes': player_logs['MIN_NUMERIC'].to_numpy(),
+    }).sort_values(keys + ['game_date'], kind='stable')
+    
+    # Expanding average through each of the player's games
+    by_player = logs.groupby(keys, sort=False)
+    logs['avg_min'] = by_player['minutes'].cumsum() / (by_player.cumcount() + 1)
+    
+    # Every team-game against every player of its team-season, then the
+    # player's average as of their last game strictly before the game date
+    games = pd.DataFrame({
+        'Game_ID': team_games['Game_ID'].astype(str),
+        'TEAM_ABBR': team_games['TEAM_ABBR'].astype(str),
+        'season_id': team_games['season_id'].astype(str),
+        'game_date': team_games['game_date'].astype('datetime64[ns]'),
+    })
+    pairs = games.merge(logs[keys].drop_duplicates(), on=['TEAM_ABBR', 'season_id'])
+    pairs = pd.merge_asof(
+        pairs.sort_values('game_date', kind='stable'),
+        logs[keys + ['game_date', 'avg_min']].sort_values('game_date', kind='stable'),
+        on='game_date', by=keys, allow_exact_matches=False,
+    )
+    return pairs.loc[pairs['avg_min'] >= STARTER_MIN_THRESHOLD,
+                     ['Game_ID', 'TEAM_ABBR', 'Player_ID', 'avg_min']]
+
+
+def add_missing_starter_minutes(team_games, player_logs, point_in_time=False):
+    """
+    Set team_games['missing_starter_minutes'] (in place): the season-average
+    minutes of the team's starters (>= STARTER_MIN_THRESHOLD MPG) absent from
+    each game's box score.
+    
+    Starters come from season averages, so `player_logs` (compact schema, at
+    least data_loader.STARTER_LOG_COLUMNS) must hold every game of each team-season in
+    `team_games`: a new game can change the value of earlier games. That is
+    the stored feature, and it leaks the rest of the season into every game.
+    With point_in_time (player_logs also need GAME_DATE), starters and their
+    averages come from each team-season's games before the game date instead
+    (see prior_starters), as they would be known at tip-off.
+    """
+    # Pre-compute "starters" (>25 MPG) per team-season, then check
+    # which starters are missing from each game's box score.
+    print("  Computing missing_starter_minutes...")
+    
+    if 'MIN_NUMERIC' not in player_logs.columns:
+        player_logs['MIN_NUMERIC'] = pd.to_numeric(player_logs['MIN'], errors='coerce').fillna(0)
+    
+    if point_in_time:
+        team_games['missing_starter_minutes'] = missing_starter_minutes(
+            team_games, prior_starters(team_games, player_logs), player_logs,
+            starter_keys=['Game_ID', 'TEAM_ABBR'],
+            played_keys=['Game_ID', 'TEAM_ABBR'],
+        )
+        return team_games
+    
+    # Step 1: Get season-average minutes per player per team-season
+    player_season_avg = player_logs.groupby(
+        ['TEAM_ABBR', 'SEASON_ID', 'Player_ID'], observed=True
+    )['MIN_NUMERIC'].mean().reset_index()
+    player_season_avg.columns = ['TEAM_ABBR', 'SEASON_ID', 'Player_ID', 'avg_min']
+    
+    # Step 2: Filter to starters only (>25 MPG)
+    starters = player_season_avg[player_season_avg['avg_min'] >= STARTER_MIN_THRESHOLD]
     
-    # Parse team abbreviation and determine home/away
-    player_logs['TEAM_ABBR'] = player_logs['MATCHUP'].apply(extract_team_from_matchup)
-    player_logs['IS_HOME'] = player_logs['MATCHUP'].apply(
-        lambda x: 1 if 'vs.' in str(x) else 0
+    starters = starters.rename(columns={'SEASON_ID': 'season_id'})
+    
+    # Step 3: Anti-join each team-game's starters against its box score
+    team_games['missing_starter_minutes'] = missing_starter_minutes(
+        team_games, starters, player_logs,
+        starter_keys=['TEAM_ABBR', 'season_id'],
+        played_keys=['Game_ID', 'TEAM_ABBR'],
     )
+    return team_games
+
+
+def aggregate_team_games(player_logs):
+    """
+    Aggregate player-level logs into per-team-game box score features,
+    opponent info and missing_starter_minutes.
     
-    # Parse game date
-    player_logs['GAME_DATE_DT'] = pd.to_datetime(player_logs['GAME_DATE'], format='mixed')
+    Every output depends only on games of the same season, so player logs
+    can be aggregated one season (or any set of whole seasons) at a time.
+    Returns an unsorted DataFrame with one row per team-game.
+    """
+    print("  Aggregating player stats to team-game level...")
     
-    # Parse win/loss
-    player_logs['WIN'] = (player_logs['WL'] == 'W').astype(int)
+    # Team abbreviation, home/away, game date and win flag are parsed once
+    # into the compact schema (a no-op for frames from data_loader)
+    player_logs = compact_player_logs(player_logs)
     
     # Compute per-player season-average minutes for missing_starter_minutes
     # Group by player and season to get their average minutes
     player_logs['MIN_NUMERIC'] = pd.to_numeric(player_logs['MIN'], errors='coerce').fillna(0)
-    player_avg_min = player_logs.groupby(['Player_ID', 'SEASON_ID'])['MIN_NUMERIC'].transform('mean')
+    player_avg_min = player_logs.groupby(
+        ['Player_ID', 'SEASON_ID'], observed=True
+    )['MIN_NUMERIC'].transform('mean')
     player_logs['PLAYER_AVG_MIN'] = player_avg_min
     
     # --- AGGREGATION ---
-    # Group by Game_ID and TEAM_ABBR (using first() for shared game-level cols)
-    team_games = player_logs.groupby(['Game_ID', 'TEAM_ABBR']).agg(
-        # Team sums
-        team_pts=('PTS', 'sum'),
-        team_reb=('REB', 'sum'),
-        team_ast=('AST', 'sum'),
-        team_stl=('STL', 'sum'),
-        team_blk=('BLK', 'sum'),
-        team_tov=('TOV', 'sum'),
-        # Star-absence maxes
-        max_pts=('PTS', 'max'),
-        max_reb=('REB', 'max'),
-        max_ast=('AST', 'max'),
-        # Efficiency (team averages of individual rates)
-        fg_pct=('FG_PCT', 'mean'),
-        fg3_pct=('FG3_PCT', 'mean'),
-        ft_pct=('FT_PCT', 'mean'),
-        efg_pct=('EFG_PCT', 'mean'),
-        ts_pct=('TS_PCT', 'mean'),
-        tov_pct=('TOV_PCT', 'mean'),
-        # Context
-        plus_minus=('PLUS_MINUS', 'mean'),
-        is_home=('IS_HOME', 'first'),
+    # Group by Game_ID and TEAM_ABBR (using first() for shared game-level cols).
+    # Keys are categorical: observed=True keeps only real pairs.
+    team_games = aggregate_box_scores(
+        player_logs, ['Game_ID', 'TEAM_ABBR'],
         # Label (kept for reference)
         win=('WIN', 'first'),
         # Date for sorting
@@ -273,49 +616,21 @@ def build_team_game_features(player_logs):
     team_games['mov'] = team_games['team_pts'] - team_games['opponent_pts']
     
     # --- MISSING STARTER MINUTES (Vectorized) ---
-    # Pre-compute "starters" (>25 MPG) per team-season, then check
-    # which starters are missing from each game's box score.
-    print("  Computing missing_starter_minutes...")
-    
-    # Step 1: Get season-average minutes per player per team-season
-    player_season_avg = player_logs.groupby(
-        ['TEAM_ABBR', 'SEASON_ID', 'Player_ID']
-    )['MIN_NUMERIC'].mean().reset_index()
-    player_season_avg.columns = ['TEAM_ABBR', 'SEASON_ID', 'Player_ID', 'avg_min']
-    
-    # Step 2: Filter to starters only (>25 MPG)
-    starters = player_season_avg[player_season_avg['avg_min'] >= STARTER_MIN_THRESHOLD]
+    add_missing_starter_minutes(team_games, player_logs)
     
-    # Step 3: Get set of player IDs who played in each game
-    played_per_game = player_logs.groupby(
-        ['Game_ID', 'TEAM_ABBR']
-    )['Player_ID'].apply(set).reset_index()
-    played_per_game.columns = ['Game_ID', 'TEAM_ABBR', 'played_ids']
+    # The team-game table is small: store its keys with their original dtypes
+    for col in ['Game_ID', 'TEAM_ABBR', 'OPP_ABBR', 'season_id']:
+        if isinstance(team_games[col].dtype, pd.CategoricalDtype):
+            team_games[col] = team_games[col].astype(team_games[col].cat.categories.dtype)
     
-    # Step 4: Merge with team_games to get season_id, then compute missing minutes
-    team_games_with_played = team_games.merge(
-        played_per_game, on=['Game_ID', 'TEAM_ABBR'], how='left'
-    )
-    
-    def calc_missing_min(row):
-        team = row['TEAM_ABBR']
-        season = row['season_id']
-        played = row.get('played_ids', set()) or set()
-        
-        team_starters = starters[
-            (starters['TEAM_ABBR'] == team) & 
-            (starters['SEASON_ID'] == season)
-        ]
-        
-        missing = 0.0
-        for _, s in team_starters.iterrows():
-            if s['Player_ID'] not in played:
-                missing += s['avg_min']
-        return missing
-    
-    team_games['missing_starter_minutes'] = team_games_with_played.apply(calc_missing_min, axis=1)
-    
-    # --- SCHEDULE CONTEXT (Vectorized) ---
+    return team_games
+
+
+def add_schedule_context(team_games):
+    """
+    Sort team-games by team and date and add rest_days, is_back_to_back and
+    games_last_7. Returns the sorted DataFrame with a fresh index.
+    """
     print("  Computing schedule context (rest_days, b2b, games_last_7)...")
     
     team_games = team_games.sort_values(['TEAM_ABBR', 'game_date']).reset_index(drop=True)
@@ -328,24 +643,24 @@ def build_team_game_features(player_logs):
     
     team_games['is_back_to_back'] = (team_games['rest_days'] == 1).astype(int)
     
-    # Games in last 7 days: rolling count per team
-    games_last_7 = []
-    for team_abbr in team_games['TEAM_ABBR'].unique():
-        team_mask = team_games['TEAM_ABBR'] == team_abbr
-        team_df = team_games[team_mask]
-        dates = team_df['game_date'].values
-        
-        for i, idx in enumerate(team_df.index):
-            current = pd.Timestamp(dates[i])
-            seven_ago = current - timedelta(days=7)
-            g7 = sum(1 for d in dates[:i] if pd.Timestamp(d) >= seven_ago)
-            games_last_7.append((idx, g7))
-    
-    for idx, val in games_last_7:
-        team_games.at[idx, 'games_last_7'] = val
+    # Games in last 7 days: rolling count per team (rows are date-sorted per team)
+    team_games['games_last_7'] = team_games.groupby('TEAM_ABBR')['game_date'].transform(
+        lambda s: games_in_window(s.values)
+    )
     
     # Drop helper columns
-    team_games = team_games.drop(columns=['prev_game_date'], errors='ignore')
+    return team_games.drop(columns=['prev_game_date'], errors='ignore')
+
+
+def build_team_game_features(player_logs):
+    """
+    Aggregate player-level logs into team-game-level features.
+    Returns a DataFrame with one row per team-game.
+    """
+    team_games = aggregate_team_games(player_logs)
+    
+    # --- SCHEDULE CONTEXT (Vectorized) ---
+    team_games = add_schedule_context(team_games)
     
     # --- ELO RATINGS & OPPONENT WIN% ---
     print("  Computing Elo ratings and opponent win%...")
@@ -358,64 +673,186 @@ def build_team_game_features(player_logs):
     return team_games, current_elo
 
 
+def sequence_order(team_games):
+    """Row order of sequence_index(): team (first-appearance order), then game date."""
+    team_codes = pd.factorize(team_games['TEAM_ABBR'])[0]
+    return np.lexsort((team_games['game_date'].to_numpy(), team_codes))
+
+
+def sequence_index(team_games, lookback=LOOKBACK):
+    """
+    Lay out team-games as one contiguous feature matrix and index its windows.
+    
+    Rows are ordered by team (first-appearance order) then game date. A window
+    starting at row r covers rows [r, r + lookback) and is labelled with the
+    win of row r + lookback, which must belong to the same team.
+    
+    Returns (feature_matrix, starts, labels):
+        feature_matrix: (rows, 24) float32, C-contiguous
+        starts:         (N,) int64 first row of each window
+        labels:         (N,) float32 win label of the game after each window
+    """
+    order = sequence_order(team_games)
+    team_codes = pd.factorize(team_games['TEAM_ABBR'])[0][order]
+    
+    feature_matrix = np.ascontiguousarray(
+        team_games[FEATURE_COLUMNS].to_numpy(dtype=np.float32)[order]
+    )
+    wins = team_games['win'].to_numpy(dtype=np.float32)[order]
+    
+    # Position of each row within its team's block, and the block length
+    team_sizes = np.bincount(team_codes)
+    block_start = np.concatenate(([0], np.cumsum(team_sizes)[:-1]))
+    pos_in_team = np.arange(len(order)) - block_start[team_codes]
+    
+    starts = np.flatnonzero(pos_in_team < team_sizes[team_codes] - lookback)
+    labels = wins[starts + lookback]
+    return feature_matrix, starts, labels
+
+
+def sliding_windows(feature_matrix, lookback=LOOKBACK):
+    """
+    Zero-copy (rows - lookback + 1, lookback, n_features) view of every window
+    of consecutive rows; index it with `starts` from sequence_index().
+    """
+    return sliding_window_view(
+        feature_matrix, (lookback, feature_matrix.shape[1])
+    )[:, 0]
+
+
+def iter_sequence_batches(feature_matrix, starts, labels, batch_size, lookback=LOOKBACK):
+    """Stream (X_batch, y_batch) pairs, materializing one batch at a time."""
+    windows = sliding_windows(feature_matrix, lookback)
+    for i in range(0, len(starts), batch_size):
+        yield windows[starts[i:i + batch_size]], labels[i:i + batch_size]
+
+
 def build_sequences(team_games, lookback=LOOKBACK):
     """
     Build rolling window sequences from team-game features.
     
     For each team, at game index i >= lookback:
-        X[n] = features from games [i-lookback, i)  (shape: lookback x 21)
-        y[n] = Margin of Victory at game i (continuous float)
+        X[n] = features from games [i-lookback, i)  (shape: lookback x 24)
+        y[n] = win label at game i
+    
+    Windows are gathered from a sliding-window view of the contiguous
+    team-game matrix straight into one preallocated float32 array.
     """
     print(f"\n  Building {lookback}-game lookback sequences...")
     
-    X_sequences = []
-    y_labels = []
-    
-    for team_abbr in team_games['TEAM_ABBR'].unique():
-        team_df = team_games[team_games['TEAM_ABBR'] == team_abbr].copy()
-        team_df = team_df.sort_values('game_date').reset_index(drop=True)
-        
-        if len(team_df) < lookback + 1:
-            continue
-        
-        feature_matrix = team_df[FEATURE_COLUMNS].values
-        labels = team_df['win'].values
-        
-        for i in range(lookback, len(team_df)):
-            X_sequences.append(feature_matrix[i - lookback:i])
-            y_labels.append(labels[i])
+    feature_matrix, starts, y = sequence_index(team_games, lookback)
     
-    X = np.array(X_sequences, dtype=np.float32)
-    y = np.array(y_labels, dtype=np.float32)
+    X = np.empty((len(starts), lookback, feature_matrix.shape[1]), dtype=np.float32)
+    np.take(sliding_windows(feature_matrix, lookback), starts, axis=0, out=X)
     
     print(f"  Generated {len(X)} sequences.")
     return X, y
 
 
+def window_row_weights(starts, n_rows, lookback=LOOKBACK):
+    """How many of the windows starting at `starts` contain each matrix row."""
+    delta = np.zeros(n_rows + 1, dtype=np.int64)
+    np.add.at(delta, starts, 1)
+    np.add.at(delta, starts + lookback, -1)
+    return np.cumsum(delta[:-1])
+
+
+def save_training_split(team_games, n_train, lookback=LOOKBACK):
+    """
+    Record the target game (Game_ID, TEAM_ABBR) of each of the first `n_train`
+    windows (the training split) in MODELS_DIR/TRAINING_SPLIT_FILE, next to
+    the scaler. The split is a cut in sequence_index order (by team, then
+    date), so it moves as the table grows; backtest.py flags in-sample games
+    from this file instead of re-deriving the cut.
+    """
+    _, starts, _ = sequence_index(team_games, lookback)
+    ordered = team_games.iloc[sequence_order(team_games)]
+    trained = ordered[['Game_ID', 'TEAM_ABBR']].iloc[starts[:n_train] + lookback]
+    path = os.path.join(MODELS_DIR, TRAINING_SPLIT_FILE)
+    trained.to_csv(path, index=False)
+    print(f"  [SAVED] {path} ({len(trained)} training target games)")
+
+
+def save_index_dataset(team_games, lookback=LOOKBACK, out_dir=DATASET_DIR):
+    """
+    Save the index-based training dataset (no materialized windows):
+        features.npy                        (rows, 24) float32, scaled
+        train_starts.npy / val_starts.npy   (N,) int32 window start rows
+        train_labels.npy / val_labels.npy   (N,) int32 win labels
+        meta.json                           lookback and feature order
+    The scaler is fitted on matrix rows weighted by how many training windows
+    contain them, i.e. the same statistics as fitting on the flattened windows.
+    """
+    print(f"\n  Indexing {lookback}-game lookback windows...")
+    feature_matrix, starts, labels = sequence_index(team_games, lookback)
+    print(f"  Indexed {len(starts)} windows over {len(feature_matrix)} team-game rows.")
+    
+    # Same split as the windowed format (80/20 in window order: by team, then date)
+    split_idx = int(len(starts) * TRAIN_FRACTION)
+    
+    weights = window_row_weights(starts[:split_idx], len(feature_matrix), lookback)
+    used = weights > 0
+    # sklearn is imported here so inference (predict_tonight) can import this module without it
+    from sklearn.preprocessing import StandardScaler
+    scaler = StandardScaler()
+    scaler.fit(feature_matrix[used], sample_weight=weights[used])
+    
+    features = np.nan_to_num(
+        scaler.transform(feature_matrix), nan=0.0, posinf=0.0, neginf=0.0
+    ).astype(np.float32)
+    
+    os.makedirs(out_dir, exist_ok=True)
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    arrays = {
+        'features': features,
+        'train_starts': starts[:split_idx].astype(np.int32),
+        'train_labels': labels[:split_idx].astype(np.int32),
+        'val_starts': starts[split_idx:].astype(np.int32),
+        'val_labels': labels[split_idx:].astype(np.int32),
+    }
+    for name, arr in arrays.items():
+        np.save(os.path.join(out_dir, f'{name}.npy'), arr)
+        print(f"  [SAVED] {out_dir}/{name}.npy: {arr.shape} {arr.dtype}")
+    
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump({'lookback': lookback, 'feature_columns': FEATURE_COLUMNS}, f, indent=2)
+    print(f"  [SAVED] {out_dir}/meta.json")
+    
+    scaler_path = os.path.join(MODELS_DIR, 'scaler.pkl')
+    joblib.dump(scaler, scaler_path)
+    print(f"  [SAVED] {scaler_path}")
+    save_training_split(team_games, split_idx, lookback)
+    print(f"\n  Train: {split_idx} windows  Val: {len(starts) - split_idx} windows")
+    print(f"  Done. Upload {out_dir}/ and the scaler to Colab; "
+          f"train with: python train_lstm.py --dataset {out_dir}")
+
+
 def main():
+    parser = argparse.ArgumentParser(description='Build LSTM training sequences')
+    parser.add_argument('--full-rebuild', action='store_true',
+                        help='Recompute the team-game feature store from all of player_logs')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processes for the per-season aggregation (default: 1, serial)')
+    parser.add_argument('--format', choices=['windows', 'index'], default='windows',
+                        help='windows: X/y .npy tensors; index: scaled row matrix + '
+                             f'window offsets in {DATASET_DIR}/')
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("  BUILD SEQUENCES — LSTM Data Generator")
     print("=" * 60)
     
-    # 1. Load data
+    # 1-3. Refresh the persisted team-game features (only new games are aggregated).
+    # Imported here because feature_store builds on this module's stages.
+    from feature_store import refresh_team_games
+    
     conn = sqlite3.connect(DB_NAME)
-    player_logs = pd.read_sql("SELECT * FROM player_logs", conn)
+    team_games = refresh_team_games(conn, full=args.full_rebuild, workers=args.workers)
     conn.close()
     
-    print(f"\n  Loaded {len(player_logs)} player-game rows from DB.")
-    
-    # 2. Fill NaN in raw data (API returns NaN for stats like FT_PCT when 0 FTA)
-    nan_count = player_logs.isna().sum().sum()
-    if nan_count > 0:
-        print(f"  Filling {nan_count} NaN values in raw data...")
-        numeric_cols = player_logs.select_dtypes(include=[np.number]).columns
-        player_logs[numeric_cols] = player_logs[numeric_cols].fillna(0)
-    
-    # 3. Ensure advanced metrics exist
-    player_logs = compute_advanced_metrics(player_logs)
-    
-    # 3. Aggregate to team-game level (now also returns current Elo state)
-    team_games, current_elo = build_team_game_features(player_logs)
+    if args.format == 'index':
+        save_index_dataset(team_games)
+        return
     
     # 4. Build sequences
     X, y = build_sequences(team_games)
@@ -424,8 +861,9 @@ def main():
     print(f"  y shape: {y.shape}")
     print(f"  Win rate: {y.mean():.3f}")
     
-    # 5. Chronological train/val split (80/20)
-    split_idx = int(len(X) * 0.8)
+    # 5. Train/val split (80/20) in window order: by team, then date, so it
+    # holds out the last teams rather than the latest games
+    split_idx = int(len(X) * TRAIN_FRACTION)
     X_train, X_val = X[:split_idx], X[split_idx:]
     y_train, y_val = y[:split_idx], y[split_idx:]
     
@@ -437,6 +875,7 @@ def main():
     n_train, timesteps, n_features = X_train.shape
     n_val = X_val.shape[0]
     
+    from sklearn.preprocessing import StandardScaler
     scaler = StandardScaler()
     X_train_flat = X_train.reshape(-1, n_features)
     scaler.fit(X_train_flat)
@@ -467,6 +906,7 @@ def main():
     print(f"  [SAVED] y_train.npy: {y_train.shape}")
     print(f"  [SAVED] y_val.npy:   {y_val.shape}")
     print(f"  [SAVED] {scaler_path}")
+    save_training_split(team_games, split_idx)
     print(f"\n  Done. Upload .npy files and scaler to Colab for training.")
 
 
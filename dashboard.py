@@ -380,7 +380,10 @@ with tab6:
         if 'Predicted_Winner' in hist_df.columns:
             try:
                 conn = sqlite3.connect('nba_stats.db')
-                actuals = pd.read_sql(f"SELECT DISTINCT Game_ID, WL, MATCHUP FROM player_logs WHERE GAME_DATE = '{selected_date.strftime('%b %d, %Y')}'", conn)
+                try:
+                    actuals = pd.read_sql("SELECT DISTINCT Game_ID, WL, MATCHUP FROM player_logs WHERE GAME_DATE_ISO = ?", conn, params=[selected_date.isoformat()])
+                except Exception:  # DB predates GAME_DATE_ISO (python data_loader.py --migrate-dates)
+                    actuals = pd.read_sql("SELECT DISTINCT Game_ID, WL, MATCHUP FROM player_logs WHERE GAME_DATE = ?", conn, params=[selected_date.strftime('%b %d, %Y')])
                 conn.close()
                 
                 if actuals.empty: st.info("No game results in dataset for this date yet.")
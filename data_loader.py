@@ -0,0 +1,302 @@
+"""
+data_loader.py — Shared loader for the player_logs table.
+
+Instead of `SELECT * FROM player_logs` into object-heavy frames, stages ask
+for the columns they need. Each chunk is converted to a compact schema as it
+is read (categorical ids and matchups, int8 flags, int16 counting stats, dates
+parsed once), and the table can be streamed one season at a time, so untyped
+rows are never held for more than one season.
+
+Usage:
+    from data_loader import load_player_logs, iter_player_logs
+    logs = load_player_logs(conn)                        # feature columns, all seasons
+    logs = load_player_logs(conn, seasons=['22025'])     # one season
+    for season_logs in iter_player_logs(conn): ...       # stream season by season
+
+    python data_loader.py --memory-report                # raw vs compact footprint
+    python data_loader.py --migrate-dates                # add GAME_DATE_ISO to an existing DB
+
+Dates: the API stores GAME_DATE as 'Apr 17, 2026'. Ingest also writes a sortable
+GAME_DATE_ISO ('2026-04-17'); when it exists, readers select it instead of
+GAME_DATE and parse it with a fixed format (or compare it directly in SQL).
+"""
+
+import numpy as np
+import pandas as pd
+import sqlite3
+import argparse
+from pandas.api.types import union_categoricals
+
+# CONFIG
+DB_NAME = 'nba_stats.db'
+TABLE = 'player_logs'
+
+# Columns used by the team-game feature builders (build_sequences / feature_store)
+FEATURE_LOG_COLUMNS = [
+    'Game_ID', 'Player_ID', 'SEASON_ID', 'GAME_DATE', 'MATCHUP', 'WL', 'MIN',
+    'PTS', 'REB', 'AST', 'STL', 'BLK', 'TOV', 'PLUS_MINUS',
+    'FG_PCT', 'FG3_PCT', 'FT_PCT', 'EFG_PCT', 'TS_PCT', 'TOV_PCT',
+]
+
+# Columns needed to recompute missing_starter_minutes over a whole season
+STARTER_LOG_COLUMNS = ['Game_ID', 'Player_ID', 'SEASON_ID', 'MATCHUP', 'MIN']
+
+# Sortable date written at ingest (see migrate_iso_dates for older DBs)
+ISO_DATE_COLUMN = 'GAME_DATE_ISO'
+ISO_DATE_FORMAT = '%Y-%m-%d'
+
+# Advanced metrics are derived from raw shooting stats when a DB predates them
+ADVANCED_COLUMNS = ['EFG_PCT', 'TS_PCT', 'TOV_PCT']
+RAW_SHOOTING_COLUMNS = ['FGM', 'FGA', 'FG3M', 'FTA']
+
+# Counting stats are whole numbers: missing values become 0 (as the feature
+# builders did) and they fit in int16. Shooting rates are float32, the precision
+# of the training tensors. Minutes stay float64 so season averages compared
+# against STARTER_MIN_THRESHOLD (and missing_starter_minutes) are unchanged.
+INT_COLUMNS = {
+    'Player_ID': 'int32',
+    'PTS': 'int16', 'REB': 'int16', 'AST': 'int16', 'STL': 'int16',
+    'BLK': 'int16', 'TOV': 'int16', 'PLUS_MINUS': 'int16',
+    'FGM': 'int16', 'FGA': 'int16', 'FG3M': 'int16', 'FG3A': 'int16',
+    'FTM': 'int16', 'FTA': 'int16', 'OREB': 'int16', 'DREB': 'int16', 'PF': 'int16',
+}
+FLOAT_COLUMNS = {
+    'MIN': 'float64',
+    'FG_PCT': 'float32', 'FG3_PCT': 'float32', 'FT_PCT': 'float32',
+    'EFG_PCT': 'float32', 'TS_PCT': 'float32', 'TOV_PCT': 'float32',
+}
+
+# Repeated strings are held as categories (integer codes + one copy of each value)
+CATEGORY_COLUMNS = ['Game_ID', 'SEASON_ID', 'MATCHUP']
+
+
+def table_columns(conn):
+    """Column names of player_logs as stored."""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({TABLE})")]
+
+
+def select_columns(conn, columns):
+    """
+    Requested columns that exist, plus raw shooting stats if advanced metrics
+    are missing. GAME_DATE is read from GAME_DATE_ISO when the table has it.
+    """
+    available = table_columns(conn)
+    if 'GAME_DATE' in columns and ISO_DATE_COLUMN in available:
+        columns = [ISO_DATE_COLUMN if c == 'GAME_DATE' else c for c in columns]
+    selected = [c for c in columns if c in available]
+    if any(c in columns and c not in available for c in ADVANCED_COLUMNS):
+        selected += [c for c in RAW_SHOOTING_COLUMNS if c in available and c not in selected]
+    return selected
+
+
+def apply_dtypes(df):
+    """Cast a raw player_logs chunk to the compact schema (in place)."""
+    for col, dtype in INT_COLUMNS.items():
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(dtype)
+    for col, dtype in FLOAT_COLUMNS.items():
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(dtype)
+    return df
+
+
+def parse_dates(values):
+    """Parse date strings once per distinct value (format='mixed')."""
+    values = values.astype('category')
+    parsed = pd.to_datetime(values.cat.categories, format='mixed')
+    return pd.Series(
+        parsed.take(values.cat.codes.to_numpy(), allow_fill=True), index=values.index
+    )
+
+
+def iso_dates(values):
+    """API date strings -> GAME_DATE_ISO strings ('2026-04-17')."""
+    return parse_dates(values).dt.strftime(ISO_DATE_FORMAT)
+
+
+def add_iso_dates(df):
+    """Add GAME_DATE_ISO to a freshly fetched LeagueGameLog frame (in place)."""
+    df[ISO_DATE_COLUMN] = iso_dates(df['GAME_DATE'])
+    return df
+
+
+def migrate_iso_dates(conn):
+    """
+    Add and fill GAME_DATE_ISO on an existing player_logs table. Idempotent:
+    only rows without an ISO date are touched. Also creates the SEASON_ID,
+    GAME_DATE_ISO and (Player_ID, GAME_DATE_ISO) indexes the readers rely on,
+    so loaders never write to the DB. Returns the number of distinct GAME_DATE strings converted.
+    """
+    columns = table_columns(conn)
+    if not columns:
+        return 0
+    if ISO_DATE_COLUMN not in columns:
+        conn.execute(f"ALTER TABLE {TABLE} ADD COLUMN {ISO_DATE_COLUMN} TEXT")
+
+    raw = pd.read_sql(
+        f"SELECT DISTINCT GAME_DATE FROM {TABLE} WHERE {ISO_DATE_COLUMN} IS NULL", conn
+    )['GAME_DATE'].dropna()
+    if not raw.empty:
+        # One keyed UPDATE pass instead of a table scan per distinct date
+        conn.execute("DROP TABLE IF EXISTS temp.iso_date_map")
+        conn.execute("CREATE TEMP TABLE iso_date_map (raw TEXT PRIMARY KEY, iso TEXT)")
+        conn.executemany(
+            "INSERT INTO temp.iso_date_map (raw, iso) VALUES (?, ?)",
+            zip(raw, iso_dates(raw))
+        )
+        conn.execute(
+            f"UPDATE {TABLE} SET {ISO_DATE_COLUMN} = "
+            f"(SELECT iso FROM temp.iso_date_map WHERE raw = {TABLE}.GAME_DATE) "
+            f"WHERE {ISO_DATE_COLUMN} IS NULL"
+        )
+        conn.execute("DROP TABLE temp.iso_date_map")
+
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_date_iso ON {TABLE} ({ISO_DATE_COLUMN})"
+    )
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_season ON {TABLE} (SEASON_ID)")
+    # Per-player recent-game cut of predict_tonight.load_roster_logs
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_player_date ON {TABLE} (Player_ID, {ISO_DATE_COLUMN})"
+    )
+    conn.commit()
+    return len(raw)
+
+
+def date_column(conn):
+    """Column to read or filter game dates on: GAME_DATE_ISO when present."""
+    return ISO_DATE_COLUMN if ISO_DATE_COLUMN in table_columns(conn) else 'GAME_DATE'
+
+
+def compact_player_logs(df):
+    """
+    Convert player logs to the compact in-memory schema (in place):
+        Game_ID, SEASON_ID, MATCHUP -> category
+        TEAM_ABBR                   -> category, parsed from MATCHUP
+        IS_HOME, WIN                -> int8 flags from MATCHUP / WL (WL is dropped)
+        GAME_DATE_DT                -> datetime64 from GAME_DATE_ISO (fixed format) or
+                                       GAME_DATE (parsed once); both are dropped
+        stats                       -> INT_COLUMNS / FLOAT_COLUMNS dtypes
+    Frames that are already compact are returned unchanged.
+    """
+    if 'GAME_DATE_DT' in df.columns:
+        return df
+    apply_dtypes(df)
+
+    if 'MATCHUP' in df.columns:
+        # Work on the distinct matchups, then broadcast through the codes
+        matchup = df['MATCHUP'].fillna('').astype(str).astype('category')
+        codes = matchup.cat.codes.to_numpy()
+        matchups = matchup.cat.categories
+        df['MATCHUP'] = matchup
+        teams = np.asarray(matchups.str.split(' ').str[0].str.strip(), dtype=object)
+        is_home = np.asarray(matchups.str.contains('vs.', regex=False), dtype='int8')
+        df['TEAM_ABBR'] = pd.Categorical(teams[codes])
+        df['IS_HOME'] = is_home[codes]
+    if 'WL' in df.columns:
+        df['WIN'] = (df['WL'] == 'W').astype('int8')
+        df.drop(columns=['WL'], inplace=True)
+    if ISO_DATE_COLUMN in df.columns:
+        dates = pd.to_datetime(df[ISO_DATE_COLUMN], format=ISO_DATE_FORMAT)
+        if 'GAME_DATE' in df.columns and dates.isna().any():
+            dates = dates.fillna(parse_dates(df['GAME_DATE']))
+        df['GAME_DATE_DT'] = dates
+    elif 'GAME_DATE' in df.columns:
+        df['GAME_DATE_DT'] = parse_dates(df['GAME_DATE'])
+    df.drop(columns=[c for c in ('GAME_DATE', ISO_DATE_COLUMN) if c in df.columns], inplace=True)
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and df[col].dtype != 'category':
+            df[col] = df[col].astype('category')
+    return df
+
+
+def concat_compact(chunks):
+    """Concatenate compact chunks, unifying categories so columns stay categorical."""
+    for col in CATEGORY_COLUMNS + ['TEAM_ABBR']:
+        if all(col in c.columns for c in chunks):
+            categories = union_categoricals(
+                [c[col] for c in chunks], sort_categories=True
+            ).categories
+            for c in chunks:
+                c[col] = c[col].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def list_seasons(conn):
+    """SEASON_IDs present in player_logs, in ascending order."""
+    rows = conn.execute(f"SELECT DISTINCT SEASON_ID FROM {TABLE} ORDER BY SEASON_ID").fetchall()
+    return [row[0] for row in rows]
+
+
+def iter_player_logs(conn, columns=FEATURE_LOG_COLUMNS, seasons=None, since=None):
+    """
+    Stream player_logs one season at a time in the compact schema
+    (see compact_player_logs). Yields nothing for seasons with no rows.
+    With `since` ('YYYY-MM-DD'), only games on or after that date are read,
+    filtered in SQL on GAME_DATE_ISO (run --migrate-dates on older DBs).
+    """
+    select = ', '.join(select_columns(conn, columns))
+    where, params = "SEASON_ID = ?", []
+    if since is not None:
+        if date_column(conn) != ISO_DATE_COLUMN:
+            raise ValueError(f"Filtering by date needs {ISO_DATE_COLUMN}; run --migrate-dates")
+        where, params = f"SEASON_ID = ? AND {ISO_DATE_COLUMN} >= ?", [since]
+    for season in (list_seasons(conn) if seasons is None else seasons):
+        chunk = pd.read_sql(
+            f"SELECT {select} FROM {TABLE} WHERE {where}", conn, params=[season] + params
+        )
+        if not chunk.empty:
+            yield compact_player_logs(chunk)
+
+
+def load_player_logs(conn, columns=FEATURE_LOG_COLUMNS, seasons=None, since=None):
+    """
+    Load the requested columns (all seasons, or only `seasons`; every game, or
+    only those on or after `since`) in the compact schema.
+    """
+    chunks = list(iter_player_logs(conn, columns, seasons, since))
+    if not chunks:
+        return compact_player_logs(pd.DataFrame(columns=select_columns(conn, columns)))
+    return concat_compact(chunks)
+
+
+def memory_report(conn, columns=FEATURE_LOG_COLUMNS):
+    """Print the in-memory size of the raw (object-typed) and compact player logs."""
+    raw = pd.read_sql(f"SELECT {', '.join(select_columns(conn, columns))} FROM {TABLE}", conn)
+    compact = load_player_logs(conn, columns)
+    raw_mb = raw.memory_usage(deep=True) / 1e6
+    compact_mb = compact.memory_usage(deep=True) / 1e6
+
+    print(f"\n  {len(raw)} player-game rows")
+    print(f"  {'column':<14}{'raw MB':>10}{'compact MB':>12}  dtype")
+    for col in compact.columns:
+        before = f"{raw_mb[col]:10.1f}" if col in raw_mb else f"{'-':>10}"
+        print(f"  {col:<14}{before}{compact_mb[col]:12.1f}  {compact[col].dtype}")
+    for col in raw.columns.difference(compact.columns):
+        print(f"  {col:<14}{raw_mb[col]:10.1f}{'-':>12}  (parsed and dropped)")
+    print(f"  {'total':<14}{raw_mb.sum():10.1f}{compact_mb.sum():12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='player_logs loader utilities')
+    parser.add_argument('--memory-report', action='store_true',
+                        help='Compare raw and compact in-memory footprints')
+    parser.add_argument('--migrate-dates', action='store_true',
+                        help=f'Add and fill {ISO_DATE_COLUMN} on an existing DB (one-time)')
+    args = parser.parse_args()
+
+    if not (args.memory_report or args.migrate_dates):
+        parser.print_help()
+        return
+
+    conn = sqlite3.connect(DB_NAME)
+    if args.migrate_dates:
+        converted = migrate_iso_dates(conn)
+        print(f"  [SAVED] {ISO_DATE_COLUMN} filled for {converted} distinct GAME_DATE values")
+    if args.memory_report:
+        memory_report(conn)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
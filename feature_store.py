@@ -0,0 +1,379 @@
+"""
+feature_store.py — Persisted team-game feature table with a watermark.
+
+Keeps the output of build_sequences.build_team_game_features in nba_stats.db
+(table `team_games`, unique on Game_ID + TEAM_ABBR) together with the date of
+the last processed game (table `feature_store_meta`).
+
+A refresh reads only the player logs dated on or after the watermark day
+(filtered in SQL on GAME_DATE_ISO) and aggregates those games. Box-score and
+opponent features depend only on the game itself. Schedule context needs at
+most the previous LOOKBACK games of each team, which are taken from the
+store. Elo resumes from its checkpoint (models/elo_state.json), so only the
+new games are replayed and upserted into the game_context table.
+
+missing_starter_minutes cannot be restricted to the tail: starters are
+chosen from season-average minutes, so one new game can change the value of
+every earlier game of that team-season. Those rows are recomputed for the
+affected season(s) from a narrow read (STARTER_LOG_COLUMNS) of their player
+logs; other seasons are reused as stored.
+
+Backfills are detected without scanning player_logs: the store records how
+many log rows precede the watermark day (counted on the date index) and a
+refresh compares that count. When it changed, when a new game predates the
+Elo checkpoint, or on DBs without GAME_DATE_ISO, the refresh falls back to
+re-aggregating every season from the earliest affected one. Stat corrections
+to rows before the watermark that keep the row count are not detected; use
+--full after such edits.
+
+Because every feature depends only on games of its own season (apart from
+Elo and schedule context), the fallback aggregation can also be sharded
+across a process pool (`--workers N`): each worker reads and aggregates whole
+seasons from its own connection, and the merged rows are put back in the
+serial (Game_ID, TEAM_ABBR) order before the cross-season schedule context
+and the sequential Elo pass run, so the output is identical to the serial path.
+
+Usage:
+    python feature_store.py               # incremental refresh
+    python feature_store.py --full        # rebuild from all of player_logs
+    python feature_store.py --workers 4   # aggregate seasons in 4 processes
+"""
+
+import pandas as pd
+import sqlite3
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from build_sequences import (
+    DB_NAME, LOOKBACK, prepare_player_logs, aggregate_team_games, add_missing_starter_minutes,
+    add_schedule_context, compute_elo_and_strength, load_elo_state
+)
+from data_loader import (
+    STARTER_LOG_COLUMNS, ISO_DATE_COLUMN, ISO_DATE_FORMAT,
+    load_player_logs, date_column, parse_dates
+)
+
+# CONFIG
+STORE_TABLE = 'team_games'
+META_TABLE = 'feature_store_meta'
+KEY_COLUMNS = ['Game_ID', 'TEAM_ABBR']
+ELO_COLUMNS = ['team_elo', 'opp_win_pct', 'opp_pts_allowed_avg']
+
+
+def table_exists(conn, name):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone()
+    return row is not None
+
+
+def read_meta(conn, key):
+    """Return a feature_store_meta value, or None."""
+    if not table_exists(conn, META_TABLE):
+        return None
+    row = conn.execute(f"SELECT value FROM {META_TABLE} WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def read_watermark(conn):
+    """Return the game date of the last processed game, or None."""
+    value = read_meta(conn, 'last_game_date')
+    return pd.Timestamp(value) if value else None
+
+
+def rows_before(conn, day):
+    """Number of player_logs rows dated before `day` ('YYYY-MM-DD'), counted on the date index."""
+    return conn.execute(
+        f"SELECT COUNT(*) FROM player_logs WHERE {ISO_DATE_COLUMN} < ?", (day,)
+    ).fetchone()[0]
+
+
+def load_team_games(conn):
+    """Load the stored team-game feature table, or None if it does not exist."""
+    if not table_exists(conn, STORE_TABLE):
+        return None
+    return pd.read_sql(
+        f"SELECT * FROM {STORE_TABLE} ORDER BY TEAM_ABBR, game_date",
+        conn, parse_dates=['game_date']
+    )
+
+
+def save_team_games(conn, team_games, seasons=None):
+    """
+    Write team-game rows to the store and advance the watermark (with the
+    count of player_logs rows before it, used to detect backfills).
+
+    With `seasons`, only rows of those seasons are replaced; otherwise the
+    whole table is rewritten.
+    """
+    if seasons is None or not table_exists(conn, STORE_TABLE):
+        team_games.to_sql(STORE_TABLE, conn, if_exists='replace', index=False)
+    else:
+        rows = team_games[team_games['season_id'].isin(seasons)]
+        placeholders = ','.join('?' for _ in seasons)
+        conn.execute(
+            f"DELETE FROM {STORE_TABLE} WHERE season_id IN ({placeholders})",
+            list(seasons)
+        )
+        rows.to_sql(STORE_TABLE, conn, if_exists='append', index=False)
+
+    conn.execute(
+        f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{STORE_TABLE}_game_team "
+        f"ON {STORE_TABLE} (Game_ID, TEAM_ABBR)"
+    )
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {META_TABLE} (key TEXT PRIMARY KEY, value TEXT)"
+    )
+    watermark = team_games['game_date'].max()
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {META_TABLE} (key, value) VALUES (?, ?)",
+        [
+            ('last_game_date', str(watermark)),
+            ('updated_at', datetime.datetime.now().isoformat(timespec='seconds')),
+        ]
+    )
+    record_row_count(conn, watermark)
+
+
+def record_row_count(conn, watermark):
+    """Store the player_logs row count before the watermark day (DBs with GAME_DATE_ISO)."""
+    if date_column(conn) == ISO_DATE_COLUMN:
+        count = rows_before(conn, watermark.strftime(ISO_DATE_FORMAT))
+        conn.execute(
+            f"INSERT OR REPLACE INTO {META_TABLE} (key, value) VALUES ('rows_before_watermark', ?)",
+            (str(count),)
+        )
+    conn.commit()
+
+
+def seasons_to_rebuild(conn, stored, watermark):
+    """
+    Seasons whose team-game rows must be recomputed: every season holding a game
+    after the watermark or missing from the store, plus all later seasons.
+    Returns (list of SEASON_IDs, date of the earliest new game); the list is
+    empty when the store is up to date.
+    """
+    # GAME_DATE_ISO when available: few distinct strings, parsed with a fixed format
+    games = pd.read_sql(
+        f"SELECT DISTINCT Game_ID, SEASON_ID, {date_column(conn)} AS GAME_DATE FROM player_logs",
+        conn
+    )
+    games['game_date'] = parse_dates(games['GAME_DATE'])
+    season_start = games.groupby('SEASON_ID')['game_date'].min()
+
+    if stored is None or watermark is None:
+        return season_start.index.tolist(), games['game_date'].min()
+
+    new_games = games[
+        (games['game_date'] > watermark) | ~games['Game_ID'].isin(stored['Game_ID'])
+    ]
+    if new_games.empty:
+        return [], None
+
+    first_affected = season_start[new_games['SEASON_ID'].unique()].min()
+    seasons = season_start[season_start >= first_affected].index.tolist()
+    return seasons, new_games['game_date'].min()
+
+
+def database_path(conn):
+    """File path of the main database behind a connection."""
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+def aggregate_season(db_path, season):
+    """Worker: read and aggregate one season's player logs on a private connection."""
+    conn = sqlite3.connect(db_path)
+    player_logs = load_player_logs(conn, seasons=[season])
+    conn.close()
+    if player_logs.empty:
+        return None
+    return aggregate_team_games(prepare_player_logs(player_logs))
+
+
+def aggregate_seasons(conn, seasons, workers=1):
+    """
+    Aggregate team-game rows for whole seasons, serially or across a pool of
+    `workers` processes. Both paths return rows in (Game_ID, TEAM_ABBR) order,
+    or None when the seasons hold no player logs.
+    """
+    if workers <= 1 or len(seasons) <= 1:
+        player_logs = load_player_logs(conn, seasons=seasons)
+        print(f"  Loaded {len(player_logs)} player-game rows from DB.")
+        if player_logs.empty:
+            return None
+        return aggregate_team_games(prepare_player_logs(player_logs))
+
+    workers = min(workers, len(seasons))
+    print(f"  Aggregating {len(seasons)} seasons across {workers} worker processes...")
+    db_path = database_path(conn)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(aggregate_season, [db_path] * len(seasons), seasons))
+
+    # Game_IDs never span seasons, so sorting on the groupby keys restores the
+    # serial row order exactly (merge order does not depend on chunking)
+    parts = [part for part in parts if part is not None and not part.empty]
+    if not parts:
+        return None
+    return pd.concat(parts).sort_values(['Game_ID', 'TEAM_ABBR'], kind='stable')
+
+
+def refresh_tail(conn, stored, watermark):
+    """
+    Incremental refresh from the player logs on or after the watermark day.
+    Returns (team_games, replaced seasons), with no seasons when the store is
+    up to date, or None when the tail cannot be applied on its own (see the
+    module docstring) and whole seasons must be re-aggregated.
+    """
+    if date_column(conn) != ISO_DATE_COLUMN:
+        return None
+    day = watermark.strftime(ISO_DATE_FORMAT)
+    counted = read_meta(conn, 'rows_before_watermark')
+    if counted is None or int(counted) != rows_before(conn, day):
+        print("  Player logs before the watermark changed (or were never counted).")
+        return None
+
+    tail_logs = load_player_logs(conn, since=day)
+    if tail_logs.empty:
+        return None
+    is_new = (tail_logs['GAME_DATE_DT'] > watermark) | \
+        ~tail_logs['Game_ID'].isin(stored['Game_ID'])
+    if not is_new.any():
+        return stored, []
+
+    # Resume Elo from its checkpoint; a new game before it means a backfill
+    state = load_elo_state()
+    if not state or not state['last_game_date'] or \
+            tail_logs.loc[is_new, 'GAME_DATE_DT'].min() < pd.Timestamp(state['last_game_date']):
+        return None
+
+    print(f"\n  Feature store watermark {watermark.date()}; aggregating "
+          f"{tail_logs.loc[is_new, 'Game_ID'].nunique()} new games from {len(tail_logs)} "
+          f"player-game rows...")
+    tail = aggregate_team_games(prepare_player_logs(tail_logs))
+    tail_ids = tail['Game_ID'].unique()
+    seasons = sorted(tail['season_id'].unique())
+    replaced = stored['Game_ID'].isin(tail_ids)
+    history = stored[~replaced]
+
+    # Schedule context from each team's last LOOKBACK stored games plus the tail
+    margin = history[history['TEAM_ABBR'].isin(tail['TEAM_ABBR'])].groupby('TEAM_ABBR').tail(LOOKBACK)
+    tail = add_schedule_context(pd.concat([margin[KEY_COLUMNS + ['game_date']], tail], ignore_index=True))
+    tail = tail[tail['Game_ID'].isin(tail_ids)].reset_index(drop=True)
+
+    # Games on the watermark day that were already replayed keep their Elo values
+    tail = tail.merge(stored.loc[replaced, KEY_COLUMNS + ELO_COLUMNS], on=KEY_COLUMNS, how='left')
+    print("  Computing Elo ratings and opponent win%...")
+    tail, _ = compute_elo_and_strength(tail, state=state, conn=conn)
+
+    # missing_starter_minutes depends on the whole season: recompute its rows
+    season_rows = pd.concat(
+        [history[history['season_id'].isin(seasons)], tail[stored.columns]], ignore_index=True
+    )
+    add_missing_starter_minutes(
+        season_rows, load_player_logs(conn, STARTER_LOG_COLUMNS, seasons=seasons)
+    )
+
+    team_games = pd.concat(
+        [history[~history['season_id'].isin(seasons)], season_rows], ignore_index=True
+    )
+    team_games = team_games.sort_values(['TEAM_ABBR', 'game_date']).reset_index(drop=True)
+    return team_games, seasons
+
+
+def refresh_seasons(conn, stored, watermark, workers=1):
+    """
+    Re-aggregate every season from the earliest one with a new game (all of
+    them without a store). Returns (team_games, replaced seasons), with no
+    seasons when the store is up to date, or None when there are no logs.
+    """
+    seasons, first_new_date = seasons_to_rebuild(conn, stored, watermark)
+    if not seasons:
+        return None if stored is None else (stored, [])
+
+    if stored is None:
+        print(f"\n  Building feature store from scratch ({len(seasons)} seasons)...")
+    else:
+        print(f"\n  Feature store watermark {watermark.date()}; "
+              f"re-aggregating seasons {seasons}...")
+
+    fresh = aggregate_seasons(conn, seasons, workers=workers)
+    if fresh is None:
+        return None
+
+    # Earlier seasons are reused as stored; their schedule context and Elo
+    # only depend on earlier games, so re-deriving them below is a no-op.
+    kept = None if stored is None else stored[~stored['season_id'].isin(seasons)]
+    team_games = fresh if kept is None or kept.empty else pd.concat(
+        [kept[fresh.columns.intersection(kept.columns)], fresh], ignore_index=True
+    )
+
+    team_games = add_schedule_context(team_games)
+
+    # Resume Elo from its checkpoint unless a new game predates it (e.g. a
+    # backfilled season), in which case the whole history is replayed
+    state = None if stored is None else load_elo_state()
+    if state and state['last_game_date'] and \
+            first_new_date >= pd.Timestamp(state['last_game_date']):
+        team_games = team_games.merge(
+            stored[KEY_COLUMNS + ELO_COLUMNS], on=KEY_COLUMNS, how='left'
+        )
+    else:
+        state = None
+
+    print("  Computing Elo ratings and opponent win%...")
+    team_games, _ = compute_elo_and_strength(team_games, state=state, conn=conn)
+    team_games = team_games.drop(columns=['OPP_ABBR'], errors='ignore')
+    return team_games, seasons
+
+
+def refresh_team_games(conn, full=False, workers=1):
+    """
+    Bring the stored team-game feature table up to date with player_logs:
+    from the tail after the watermark when possible, otherwise by whole
+    seasons (with workers > 1 the per-season aggregation runs in a process pool).
+    Returns the full team-game DataFrame (same layout as build_team_game_features).
+    """
+    stored = None if full else load_team_games(conn)
+    watermark = None if stored is None else read_watermark(conn)
+
+    result = None
+    if watermark is not None:
+        result = refresh_tail(conn, stored, watermark)
+        if result is None:
+            print("  Falling back to re-aggregating whole seasons.")
+    if result is None:
+        result = refresh_seasons(conn, stored, watermark, workers=workers)
+    if result is None:
+        print("[FAIL] No player logs to aggregate. Run the data ingest first.")
+        return stored
+
+    team_games, seasons = result
+    if not seasons:
+        if read_meta(conn, 'rows_before_watermark') is None:
+            record_row_count(conn, watermark)
+        print(f"\n  Feature store up to date (watermark {watermark.date()}, "
+              f"{len(stored)} team-game rows).")
+        return stored
+
+    save_team_games(conn, team_games, seasons=None if stored is None else seasons)
+    print(f"  [SAVED] {STORE_TABLE} table ({len(team_games)} team-game rows, "
+          f"watermark {team_games['game_date'].max().date()})")
+    return team_games
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Refresh the team-game feature store')
+    parser.add_argument('--full', action='store_true',
+                        help='Rebuild every season from player_logs')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processes for the per-season aggregation (default: 1, serial)')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(DB_NAME)
+    refresh_team_games(conn, full=args.full, workers=args.workers)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ import sqlite3
 import numpy as np
 from nba_api.stats.endpoints import leaguegamelog
 
+from data_loader import add_iso_dates, migrate_iso_dates
+
 # CONFIG
 SEASON_STR = '2025-26' 
 SEASON_ID = '22025'
@@ -51,11 +53,17 @@ def fetch_stats():
         # Compute advanced metrics
         df = compute_advanced_metrics(df)
         
+        # Sortable ISO date alongside the API's 'Apr 17, 2026' strings
+        df = add_iso_dates(df)
+        
         # Delete the CURRENT season from the database so we can safely refresh it
         # without destroying the 10 years of historical backfill data
         conn.execute(f"DELETE FROM player_logs WHERE SEASON_ID = '{SEASON_ID}'")
         conn.commit()
         
+        # Older DBs get the GAME_DATE_ISO column (no-op once migrated)
+        migrate_iso_dates(conn)
+        
         # Append updated current season
         df.to_sql('player_logs', conn, if_exists='append', index=False)
         print(f"\n[SUCCESS] Updated {len(df)} games for {SEASON_STR} in database.")
@@ -4,6 +4,8 @@ import pandas as pd
 import sqlite3
 import numpy as np
 
+from data_loader import load_player_logs
+
 # CONFIG
 DB_NAME = "nba_stats.db"
 
@@ -46,13 +48,11 @@ if not games_df.empty:
         
         # We need to map TEAM_ID from player_logs via MATCHUP parsing
         # Load all game dates from DB grouped by team
-        all_logs = pd.read_sql("SELECT GAME_DATE, MATCHUP, Player_ID FROM player_logs", conn)
+        all_logs = load_player_logs(conn, columns=['GAME_DATE', 'MATCHUP', 'Player_ID'])
         conn.close()
         
         if not all_logs.empty:
-            # Parse team abbreviation from MATCHUP (e.g. "LAL vs. BOS" -> "LAL")
-            all_logs['GAME_DATE_PARSED'] = pd.to_datetime(all_logs['GAME_DATE'], format='mixed')
-            
+            # GAME_DATE is parsed once by data_loader (GAME_DATE_DT)
             today_dt = pd.to_datetime(today_str)
             
             context_rows = []
@@ -65,7 +65,7 @@ if not games_df.empty:
                     
                     # Get this team's game dates from DB
                     team_logs = all_logs[all_logs['Player_ID'].isin(team_players)]
-                    team_dates = team_logs['GAME_DATE_PARSED'].drop_duplicates().sort_values(ascending=False)
+                    team_dates = team_logs['GAME_DATE_DT'].drop_duplicates().sort_values(ascending=False)
                     
                     if len(team_dates) > 0:
                         last_game_date = team_dates.iloc[0]
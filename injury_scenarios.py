@@ -0,0 +1,190 @@
+"""
+injury_scenarios.py — Batched "what if player X sits?" engine for tonight's slate.
+
+For every team on the slate, each available starter (not already on the
+injury report) is taken out in turn, and with --pairs every pair of them.
+A scenario is tonight's window with missing_starter_minutes on the most
+recent timestep set to tonight's baseline plus the absent players' average
+minutes — the same write rule predict_tonight.apply_injury_override uses for
+the real injury report, so a scenario differs from its baseline only by the
+minutes out.
+
+All baseline and scenario tensors are stacked into one array and scored in
+a single forward pass. Each scenario's win probability is normalized
+against the opponent's baseline, as in predict_tonight.py, and compared with
+the team's baseline probability.
+
+Output: injury_scenarios.csv — one row per scenario, largest drops first.
+
+Usage:
+    python injury_scenarios.py
+    python injury_scenarios.py --pairs
+"""
+
+import pandas as pd
+import sqlite3
+import numpy as np
+import os
+import itertools
+import joblib
+import argparse
+
+from predict_tonight import (
+    DB_NAME, FEATURE_COLUMNS, MODELS_DIR, WEIGHTS_FILE, WINDOW_CACHE_FILE,
+    apply_injury_override, get_injured_player_names, get_team_name, load_elo_ratings,
+    load_inference_model, load_window_cache, normalize_matchup, normalize_name,
+    predict_batch, save_window_cache, team_windows, tonight_missing_minutes,
+)
+
+# CONFIG
+OUTPUT_FILE = "injury_scenarios.csv"
+MISSING_MIN_IDX = FEATURE_COLUMNS.index('missing_starter_minutes')
+
+
+def absence_scenarios(team_id, rosters_df, injured_names, starters, pairs=False):
+    """
+    Absence scenarios among the team's available starters: a list of
+    ((Player_ID, ...), (name, ...), minutes out) for every single starter,
+    plus every pair with `pairs`.
+    """
+    roster = rosters_df[rosters_df['TeamID'] == team_id]
+    available = [
+        (pid, name) for pid, name in zip(roster['PLAYER_ID'], roster['PLAYER'])
+        if pid in starters and normalize_name(name) not in injured_names
+    ]
+    
+    scenarios = []
+    for size in ((1, 2) if pairs else (1,)):
+        for combo in itertools.combinations(available, size):
+            pids, names = zip(*combo)
+            scenarios.append((pids, names, sum(starters[pid] for pid in pids)))
+    return scenarios
+
+
+def scenario_windows(window, base_missing, minutes_out):
+    """
+    Stack one copy of the baseline sequence (`window` with tonight's override
+    applied) per scenario, with the most recent game's missing_starter_minutes
+    set to tonight's baseline plus the minutes out.
+    Raises ValueError unless every entry of `minutes_out` is finite and
+    non-negative (an absence never lowers the baseline).
+    Returns an (n_scenarios, 10, 24) array.
+    """
+    minutes_out = np.asarray(minutes_out, dtype=np.float32)
+    if not np.isfinite(minutes_out).all() or (minutes_out < 0).any():
+        raise ValueError(f"Minutes out must be finite and non-negative, got {minutes_out.tolist()}")
+    
+    baseline = apply_injury_override(window, base_missing)
+    variants = np.repeat(baseline[np.newaxis], len(minutes_out), axis=0)
+    variants[:, -1, MISSING_MIN_IDX] = base_missing + minutes_out
+    return variants
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Win-probability impact of starter absences')
+    parser.add_argument('--pairs', action='store_true',
+                        help='Also score every pair of starters sitting together')
+    parser.add_argument('--out', default=OUTPUT_FILE)
+    args = parser.parse_args()
+    
+    print("--- INJURY SCENARIOS ---")
+    
+    # 1. Model (scaler only when it is not baked into the NumPy export)
+    model_path = os.path.join(MODELS_DIR, 'lstm_model.keras')
+    model = load_inference_model(model_path, os.path.join(MODELS_DIR, WEIGHTS_FILE))
+    scaler = None
+    if not getattr(model, 'scales_inputs', False):
+        scaler = joblib.load(os.path.join(MODELS_DIR, 'scaler.pkl'))
+    
+    # 2. Tonight's slate, rosters and injury report
+    games = pd.read_csv('todays_games.csv')
+    rosters = pd.read_csv('todays_rosters.csv')
+    injured_names = get_injured_player_names()
+    elo_ratings = load_elo_ratings()
+    
+    # 3. Team windows (shared cache with predict_tonight.py)
+    conn = sqlite3.connect(DB_NAME)
+    team_ids = pd.concat([games['HOME_TEAM_ID'], games['VISITOR_TEAM_ID']]).unique()
+    cache_path = os.path.join(MODELS_DIR, WINDOW_CACHE_FILE)
+    cache = load_window_cache(cache_path)
+    windows, rebuilt = team_windows(conn, rosters, team_ids, cache, elo_ratings=elo_ratings)
+    if rebuilt:
+        save_window_cache(cache_path, cache)
+    conn.close()
+    team_names = {t: get_team_name(t) for t in team_ids}
+    
+    # 4. Baseline sequences (two per game) followed by every scenario variant
+    baseline = []     # (game_id, home_id, away_id)
+    sequences = []    # home, away, home, away, ...
+    scenario_rows = []
+    variant_blocks = []
+    
+    for game_id, home_id, away_id in zip(games['GAME_ID'], games['HOME_TEAM_ID'], games['VISITOR_TEAM_ID']):
+        (home_window, home_starters), (away_window, away_starters) = (
+            windows[int(home_id)], windows[int(away_id)]
+        )
+        if home_window is None or away_window is None:
+            print(f"  [SKIP] {team_names[away_id]} @ {team_names[home_id]}: insufficient data")
+            continue
+        
+        game_idx = len(baseline)
+        baseline.append((game_id, home_id, away_id))
+        
+        for side, team_id, window, starters in [
+            (0, home_id, home_window, home_starters), (1, away_id, away_window, away_starters)
+        ]:
+            base_missing = tonight_missing_minutes(team_id, rosters, injured_names, starters)
+            sequences.append(apply_injury_override(window, base_missing))
+            
+            scenarios = absence_scenarios(team_id, rosters, injured_names, starters, args.pairs)
+            if not scenarios:
+                continue
+            variant_blocks.append(scenario_windows(window, base_missing, [s[2] for s in scenarios]))
+            scenario_rows += [(game_idx, side, team_id) + s for s in scenarios]
+    
+    if not baseline:
+        print("[FAIL] No scorable games on the slate.")
+        return
+    
+    # 5. One forward pass over baselines and scenarios
+    X = np.concatenate([np.stack(sequences)] + variant_blocks)
+    raw_probs = predict_batch(model, scaler, X)
+    base_raw = raw_probs[:len(sequences)].reshape(-1, 2)
+    scenario_raw = raw_probs[len(sequences):]
+    print(f"  Scored {len(baseline)} games and {len(scenario_rows)} scenarios in one batch "
+          f"({len(X)} sequences).")
+    
+    # 6. Win-probability deltas, normalized against the opponent's baseline
+    rows = []
+    for raw, (game_idx, side, team_id, pids, names, minutes_out) in zip(scenario_raw, scenario_rows):
+        game_id, home_id, away_id = baseline[game_idx]
+        opponent_id = away_id if side == 0 else home_id
+        base_prob = normalize_matchup(*base_raw[game_idx])[side]
+        opp_raw = base_raw[game_idx][1 - side]
+        prob = normalize_matchup(raw, opp_raw)[0]
+        
+        rows.append({
+            'GAME_ID': game_id,
+            'Team': team_names[team_id],
+            'Opponent': team_names[opponent_id],
+            'Sitting': ' + '.join(names),
+            'Player_IDs': ' '.join(str(pid) for pid in pids),
+            'Minutes_Out': round(float(minutes_out), 1),
+            'Base_Win_Prob': round(float(base_prob), 4),
+            'Scenario_Win_Prob': round(float(prob), 4),
+            'Delta': round(float(prob - base_prob), 4),
+        })
+    
+    if not rows:
+        print("[FAIL] No available starters to take out.")
+        return
+    
+    table = pd.DataFrame(rows).sort_values('Delta').reset_index(drop=True)
+    table.to_csv(args.out, index=False)
+    print(f"\n  [SAVED] {args.out} ({len(table)} scenarios)")
+    print(table[['Team', 'Sitting', 'Base_Win_Prob', 'Scenario_Win_Prob', 'Delta']]
+          .head(15).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+lstm_numpy.py — TensorFlow-free inference runtime for the BiLSTM+Attention model.
+
+export_weights() dumps the weights of a trained Keras model (LSTM kernels,
+BatchNorm statistics, Attention W/b, dense layers) to an .npz file, and
+NumpyLSTMModel replays the forward pass in NumPy from that file. Dropout is
+the identity at inference; its rates are exported for Monte Carlo dropout
+(NumpyLSTMModel.sample), which keeps dropout active while BatchNorm stays on
+its moving statistics.
+
+The StandardScaler from build_sequences.py is baked into the same file
+(scaler_mean / scaler_scale). On load it is folded into the first LSTM's
+input kernel and bias, so the runtime takes raw (unscaled) features and
+neither sklearn nor scaler.pkl is needed at inference.
+
+Keras conventions reproduced here:
+    LSTM gates are packed as (i, f, c, o); activation tanh, recurrent sigmoid
+    The backward LSTM reads the sequence reversed; Bidirectional flips its
+    outputs back before concatenating [forward, backward]
+    BatchNorm uses the moving mean/variance and the layer's epsilon
+
+Usage:
+    python lstm_numpy.py            # export models/lstm_model.keras → models/lstm_weights.npz
+    python lstm_numpy.py --check    # also compare against Keras on X_val.npy (or random input)
+    python lstm_numpy.py --scaler none   # export without baking models/scaler.pkl
+"""
+
+import numpy as np
+import os
+import argparse
+
+# CONFIG
+MODELS_DIR = "models"
+MODEL_FILE = "lstm_model.keras"
+SCALER_FILE = "scaler.pkl"
+WEIGHTS_FILE = "lstm_weights.npz"
+TOLERANCE = 1e-5  # Max |p_numpy - p_keras| accepted by --check
+
+
+def export_weights(model, path, scaler=None):
+    """
+    Write the inference weights of a build_model() network to `path` (.npz).
+    Layers are stored in call order as L{i}_<name> arrays plus a `layers`
+    array naming each layer's kind. A fitted StandardScaler, when given, is
+    stored as scaler_mean / scaler_scale.
+    """
+    np.savez(path, **model_arrays(model, scaler))
+    return path
+
+
+def model_arrays(model, scaler=None):
+    """The arrays export_weights() writes, as a dict."""
+    kinds = []
+    arrays = {}
+    
+    for layer in model.layers:
+        kind = type(layer).__name__
+        prefix = f"L{len(kinds)}_"
+        
+        if kind == 'Bidirectional':
+            for direction, sub in [('fw', layer.forward_layer), ('bw', layer.backward_layer)]:
+                kernel, recurrent_kernel, bias = sub.get_weights()
+                arrays[prefix + direction + '_kernel'] = kernel
+                arrays[prefix + direction + '_recurrent_kernel'] = recurrent_kernel
+                arrays[prefix + direction + '_bias'] = bias
+            kinds.append('bilstm')
+        elif kind == 'BatchNormalization':
+            gamma, beta, mean, var = layer.get_weights()
+            arrays.update({
+                prefix + 'gamma': gamma, prefix + 'beta': beta,
+                prefix + 'mean': mean, prefix + 'var': var,
+                prefix + 'epsilon': np.float32(layer.epsilon),
+            })
+            kinds.append('batchnorm')
+        elif kind == 'Attention':
+            W, b = layer.get_weights()
+            arrays[prefix + 'W'] = W
+            arrays[prefix + 'b'] = b
+            kinds.append('attention')
+        elif kind == 'Dense':
+            kernel, bias = layer.get_weights()
+            arrays[prefix + 'kernel'] = kernel
+            arrays[prefix + 'bias'] = bias
+            arrays[prefix + 'activation'] = np.array(layer.get_config()['activation'])
+            kinds.append('dense')
+        elif kind == 'Dropout':
+            arrays[prefix + 'rate'] = np.float32(layer.rate)
+            kinds.append('dropout')
+        elif kind == 'InputLayer':
+            continue
+        else:
+            raise ValueError(f"Cannot export layer {layer.name} ({kind})")
+    
+    arrays['layers'] = np.array(kinds)
+    
+    if scaler is not None:
+        n_features = model.input_shape[-1]
+        mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(n_features)
+        scale = scaler.scale_ if scaler.scale_ is not None else np.ones(n_features)
+        arrays['scaler_mean'] = np.asarray(mean, dtype=np.float64)
+        arrays['scaler_scale'] = np.asarray(scale, dtype=np.float64)
+    
+    return arrays
+
+
+def sigmoid(x):
+    """Logistic function without overflow for large |x|."""
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': sigmoid,
+    'tanh': np.tanh,
+}
+
+
+def lstm_forward(x, kernel, recurrent_kernel, bias, reverse=False):
+    """
+    Run one LSTM direction over x (batch, timesteps, features) and return
+    every hidden state (batch, timesteps, units) in input time order.
+    """
+    n, timesteps, _ = x.shape
+    units = recurrent_kernel.shape[0]
+    
+    # Input projections for all timesteps in one matmul
+    z_x = x @ kernel + bias
+    
+    h = np.zeros((n, units), dtype=x.dtype)
+    c = np.zeros((n, units), dtype=x.dtype)
+    out = np.empty((n, timesteps, units), dtype=x.dtype)
+    
+    steps = range(timesteps - 1, -1, -1) if reverse else range(timesteps)
+    for t in steps:
+        z = z_x[:, t] + h @ recurrent_kernel
+        i = sigmoid(z[:, :units])
+        f = sigmoid(z[:, units:2 * units])
+        g = np.tanh(z[:, 2 * units:3 * units])
+        o = sigmoid(z[:, 3 * units:])
+        c = f * c + i * g
+        h = o * np.tanh(c)
+        out[:, t] = h
+    
+    return out
+
+
+class NumpyLSTMModel:
+    """
+    Forward pass of the exported BiLSTM+Attention network. Call it like a
+    Keras model: model(X) or model.predict(X) returns (batch, 1) probabilities.
+    
+    With a baked scaler (scales_inputs), X holds raw features: the scaling
+    (x - mean) / scale is linear, so it is folded into the first LSTM's input
+    kernel and bias here instead of being applied to every input.
+    
+    `source` is an exported .npz path or a model_arrays() dict.
+    """
+    
+    def __init__(self, source):
+        if isinstance(source, dict):
+            self.weights = dict(source)
+        else:
+            with np.load(source) as data:
+                self.weights = {k: data[k] for k in data.files}
+        self.layers = [str(kind) for kind in self.weights['layers']]
+        self.has_dropout = 'dropout' in self.layers
+        
+        self.scales_inputs = 'scaler_mean' in self.weights
+        if self.scales_inputs:
+            if self.layers[0] != 'bilstm':
+                raise ValueError(f"Cannot fold the scaler into a leading {self.layers[0]} layer")
+            mean = self.weights['scaler_mean']
+            scale = self.weights['scaler_scale']
+            for direction in ('fw', 'bw'):
+                kernel = self._get(0, direction + '_kernel').astype(np.float64)
+                bias = self._get(0, direction + '_bias').astype(np.float64)
+                self.weights[f"L0_{direction}_kernel"] = (kernel / scale[:, None]).astype(np.float32)
+                self.weights[f"L0_{direction}_bias"] = (bias - (mean / scale) @ kernel).astype(np.float32)
+    
+    def _get(self, i, name):
+        return self.weights[f"L{i}_{name}"]
+    
+    @classmethod
+    def from_keras(cls, model):
+        """Runtime for an in-memory Keras model (inputs scaled by the caller)."""
+        return cls(model_arrays(model))
+    
+    def __call__(self, X, training=False):
+        return self._forward(X)
+    
+    def predict(self, X, verbose=0):
+        return self(X)
+    
+    def sample(self, X, n_samples, rng=None):
+        """
+        Monte Carlo dropout: tile X n_samples times, run one forward pass with
+        every Dropout layer drawing its own mask, and return the probabilities
+        as an (n_samples, len(X)) array.
+        """
+        if not self.has_dropout:
+            raise ValueError("These weights were exported without Dropout layers; "
+                             "re-export them with lstm_numpy.py")
+        rng = rng if rng is not None else np.random.default_rng()
+        X = np.asarray(X, dtype=np.float32)
+        tiled = np.tile(X, (n_samples,) + (1,) * (X.ndim - 1))
+        return self._forward(tiled, rng=rng).reshape(n_samples, len(X))
+    
+    def _forward(self, X, rng=None):
+        """Forward pass; with `rng`, Dropout is active (inverted dropout, as in Keras)."""
+        x = np.asarray(X, dtype=np.float32)
+        
+        for i, kind in enumerate(self.layers):
+            if kind == 'bilstm':
+                forward = lstm_forward(
+                    x, self._get(i, 'fw_kernel'), self._get(i, 'fw_recurrent_kernel'),
+                    self._get(i, 'fw_bias')
+                )
+                backward = lstm_forward(
+                    x, self._get(i, 'bw_kernel'), self._get(i, 'bw_recurrent_kernel'),
+                    self._get(i, 'bw_bias'), reverse=True
+                )
+                x = np.concatenate([forward, backward], axis=-1)
+            elif kind == 'batchnorm':
+                inv = self._get(i, 'gamma') / np.sqrt(self._get(i, 'var') + self._get(i, 'epsilon'))
+                x = (x - self._get(i, 'mean')) * inv + self._get(i, 'beta')
+            elif kind == 'attention':
+                score = np.tanh(x @ self._get(i, 'W') + self._get(i, 'b'))  # (batch, timesteps, 1)
+                score = np.exp(score - score.max(axis=1, keepdims=True))
+                attention_weights = score / score.sum(axis=1, keepdims=True)
+                x = (x * attention_weights).sum(axis=1)
+            elif kind == 'dense':
+                activation = ACTIVATIONS[str(self._get(i, 'activation'))]
+                x = activation(x @ self._get(i, 'kernel') + self._get(i, 'bias'))
+            elif kind == 'dropout' and rng is not None:
+                rate = float(self._get(i, 'rate'))
+                keep = rng.random(x.shape, dtype=np.float32) >= rate
+                x = np.where(keep, x / np.float32(1.0 - rate), np.float32(0.0))
+        
+        return x
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the LSTM weights for NumPy inference')
+    parser.add_argument('--model', default=os.path.join(MODELS_DIR, MODEL_FILE))
+    parser.add_argument('--out', default=os.path.join(MODELS_DIR, WEIGHTS_FILE))
+    parser.add_argument('--scaler', default=os.path.join(MODELS_DIR, SCALER_FILE),
+                        help="Scaler to bake into the export ('none' to skip)")
+    parser.add_argument('--check', action='store_true',
+                        help='Compare NumPy and Keras outputs on X_val.npy (or random input)')
+    args = parser.parse_args()
+    
+    print("--- EXPORTING LSTM WEIGHTS ---")
+    
+    # TensorFlow is only needed to read the .keras file
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    from tensorflow.keras.models import load_model
+    from train_lstm import Attention
+    
+    model = load_model(args.model, custom_objects={'Attention': Attention})
+    
+    scaler = None
+    if args.scaler != 'none' and os.path.exists(args.scaler):
+        import joblib
+        scaler = joblib.load(args.scaler)
+        print(f"  Baking {args.scaler} into the export")
+    elif args.scaler != 'none':
+        print(f"  [WARNING] {args.scaler} not found; inputs must be scaled by the caller")
+    
+    export_weights(model, args.out, scaler)
+    print(f"  [SAVED] {args.out}")
+    
+    if args.check:
+        if os.path.exists('X_val.npy'):
+            X = np.load('X_val.npy', mmap_mode='r')[:1024].astype(np.float32)
+        else:
+            X = np.random.default_rng(0).standard_normal(
+                (256,) + tuple(model.input_shape[1:])
+            ).astype(np.float32)
+        
+        expected = np.asarray(model(X, training=False))
+        # X is already scaled: feed the runtime the raw features it expects
+        raw = scaler.inverse_transform(X.reshape(-1, X.shape[-1])).reshape(X.shape) if scaler else X
+        actual = NumpyLSTMModel(args.out)(raw)
+        max_diff = np.abs(actual - expected).max()
+        status = "OK" if max_diff <= TOLERANCE else "FAIL"
+        print(f"  [{status}] max |numpy - keras| = {max_diff:.2e} on {len(X)} sequences")
+
+
+if __name__ == "__main__":
+    main()
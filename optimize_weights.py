@@ -5,6 +5,8 @@ import numpy as np
 import os
 import argparse
 
+from data_loader import load_player_logs
+
 # CONFIG
 DB_NAME = "nba_stats.db"
 WEIGHTS_FILE = "weights.json"
@@ -64,7 +66,7 @@ def run_teacher(mode):
     print(f"--- TEACHER RUNNING IN [{mode.upper()}] MODE ---")
     
     conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql("SELECT * FROM player_logs", conn)
+    df = load_player_logs(conn, columns=['Player_ID', 'GAME_DATE', 'MATCHUP', 'PTS', 'MIN'])
     conn.close()
 
     # Prep Data
@@ -81,7 +83,7 @@ def run_teacher(mode):
         print(f"Error mapping teams: {e}")
         return
 
-    df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'])
+    df['GAME_DATE'] = df['GAME_DATE_DT']  # parsed once by data_loader
     df = df.sort_values(by=['PLAYER_ID', 'GAME_DATE'], ascending=[True, True])
     
     weights = load_weights()
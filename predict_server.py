@@ -0,0 +1,307 @@
+"""
+predict_server.py — Warm local prediction service.
+
+Keeps the model (NumPy runtime when exported), injuries, rosters, Elo
+ratings and every team's unscaled (10, 24) lookback window in memory and answers
+over HTTP on localhost, so a re-prediction after a late injury update costs
+one small forward pass instead of a fresh predict_tonight.py run:
+
+    GET /predict?home=<team>&away=<team>   one matchup (team ID or abbreviation)
+    GET /slate                              every game in todays_games.csv
+    GET /health                             loaded artifacts and cache size
+
+Responses are JSON with the same fields as final_predictions.csv.
+
+Artifacts are checked by mtime on every request: a new model export reloads
+the model; a changed DB, roster or Elo file revalidates the team windows
+against the window cache shared with predict_tonight.py (only teams whose
+players have played are rebuilt). Injury, schedule and slate files are
+simply re-read: tonight's injury override is applied per request.
+
+Usage:
+    python predict_server.py
+    python predict_server.py --port 8765
+    curl 'http://127.0.0.1:8765/predict?home=BOS&away=NYK'
+"""
+
+import pandas as pd
+import sqlite3
+import numpy as np
+import os
+import json
+import time
+import joblib
+import argparse
+import threading
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from predict_tonight import (
+    DB_NAME, MODELS_DIR, WEIGHTS_FILE, WINDOW_CACHE_FILE, apply_injury_override,
+    get_injured_player_names, get_schedule_context, get_team_name, load_elo_ratings,
+    load_inference_model, load_window_cache, normalize_matchup, predict_batch,
+    save_window_cache, team_windows, tonight_missing_minutes,
+)
+
+# CONFIG
+HOST = "127.0.0.1"  # localhost only
+PORT = 8765
+MODEL_PATH = os.path.join(MODELS_DIR, 'lstm_model.keras')
+WEIGHTS_PATH = os.path.join(MODELS_DIR, WEIGHTS_FILE)
+SCALER_PATH = os.path.join(MODELS_DIR, 'scaler.pkl')
+WINDOW_CACHE_PATH = os.path.join(MODELS_DIR, WINDOW_CACHE_FILE)
+GAMES_FILE = 'todays_games.csv'
+ROSTERS_FILE = 'todays_rosters.csv'
+
+# A change to any of these reloads the model / revalidates the team windows /
+# re-reads tonight's context
+MODEL_ARTIFACTS = [WEIGHTS_PATH, MODEL_PATH, SCALER_PATH]
+WINDOW_ARTIFACTS = [DB_NAME, ROSTERS_FILE, os.path.join(MODELS_DIR, 'elo_ratings.json')]
+CONTEXT_ARTIFACTS = [GAMES_FILE, 'injuries.csv', 'schedule_context.csv']
+
+
+def resolve_team(value):
+    """Team ID from a numeric ID or an abbreviation such as 'BOS'."""
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    from nba_api.stats.static import teams
+    info = teams.find_team_by_abbreviation(value.upper())
+    if not info:
+        raise ValueError(f"Unknown team: {value}")
+    return info['id']
+
+
+class PredictionService:
+    """Model, context and per-team lookback windows, refreshed by mtime."""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.mtimes = {}
+        self.windows = {}      # team_id -> (window or None, starters), validated against the DB
+        self.cache = load_window_cache(WINDOW_CACHE_PATH)
+        self.team_names = {}
+        self.refresh()
+    
+    def _changed(self, paths):
+        """Record the current mtimes of `paths`; True if any differs from last time."""
+        changed = False
+        for path in paths:
+            mtime = os.path.getmtime(path) if os.path.exists(path) else None
+            if path not in self.mtimes or self.mtimes[path] != mtime:
+                self.mtimes[path] = mtime
+                changed = True
+        return changed
+    
+    def refresh(self):
+        """Reload whatever changed on disk since the last request."""
+        if self._changed(MODEL_ARTIFACTS):
+            self.model = load_inference_model(MODEL_PATH, WEIGHTS_PATH)
+            self.scaler = None
+            if not getattr(self.model, 'scales_inputs', False):
+                self.scaler = joblib.load(SCALER_PATH)
+        
+        if self._changed(WINDOW_ARTIFACTS):
+            print("  Loading rosters and Elo ratings...")
+            self.rosters = pd.read_csv(ROSTERS_FILE)
+            self.elo_ratings = load_elo_ratings()
+            self.windows = {}
+        
+        if self._changed(CONTEXT_ARTIFACTS):
+            print("  Loading tonight's games, injuries and schedule context...")
+            self.games = pd.read_csv(GAMES_FILE) if os.path.exists(GAMES_FILE) else pd.DataFrame(
+                columns=['GAME_ID', 'HOME_TEAM_ID', 'VISITOR_TEAM_ID']
+            )
+            self.injured_names = get_injured_player_names()
+            self.schedule_ctx = get_schedule_context()
+    
+    def invalidate(self):
+        """Forget the recorded mtimes so the next request reloads everything
+        (used after a failed request, which may have left a load half done)."""
+        with self.lock:
+            self.mtimes.clear()
+    
+    def team_name(self, team_id):
+        if team_id not in self.team_names:
+            self.team_names[team_id] = get_team_name(team_id)
+        return self.team_names[team_id]
+    
+    def team_sequences(self, team_ids):
+        """
+        Sequences for `team_ids` with tonight's injury override. Windows not
+        yet validated since the last DB change are checked against the cache
+        (rebuilding stale teams from one roster query).
+        """
+        missing = [t for t in team_ids if t not in self.windows]
+        if missing:
+            conn = sqlite3.connect(DB_NAME)
+            try:
+                # A window does not depend on venue or opponent
+                windows, rebuilt = team_windows(
+                    conn, self.rosters, missing, self.cache, elo_ratings=self.elo_ratings
+                )
+            finally:
+                conn.close()
+            self.windows.update(windows)
+            if rebuilt:
+                save_window_cache(WINDOW_CACHE_PATH, self.cache)
+        
+        return {
+            t: apply_injury_override(
+                self.windows[t][0],
+                tonight_missing_minutes(t, self.rosters, self.injured_names, self.windows[t][1])
+            )
+            for t in team_ids
+        }
+    
+    def predict(self, matchups):
+        """
+        Score (home_id, away_id, game_id) matchups in one forward pass.
+        Returns one final_predictions.csv-style dict per matchup.
+        """
+        with self.lock:
+            self.refresh()
+            team_ids = list(dict.fromkeys(t for home, away, _ in matchups for t in (home, away)))
+            windows = self.team_sequences(team_ids)
+            
+            scorable = [windows[home] is not None and windows[away] is not None
+                        for home, away, _ in matchups]
+            sequences = [
+                windows[t] for (home, away, _), ok in zip(matchups, scorable) if ok
+                for t in (home, away)
+            ]
+            raw_probs = iter(predict_batch(self.model, self.scaler, sequences) if sequences else [])
+            
+            results = []
+            for (home, away, game_id), ok in zip(matchups, scorable):
+                result = {
+                    'GAME_ID': game_id,
+                    'HOME_TEAM_ID': home,
+                    'VISITOR_TEAM_ID': away,
+                    'Home_Team': self.team_name(home),
+                    'Away_Team': self.team_name(away),
+                }
+                if not ok:
+                    result['error'] = 'Insufficient data for this matchup'
+                    results.append(result)
+                    continue
+                
+                home_prob, away_prob = normalize_matchup(next(raw_probs), next(raw_probs))
+                home_wins = home_prob > away_prob
+                result.update({
+                    'Home_Win_Prob': round(float(home_prob), 4),
+                    'Away_Win_Prob': round(float(away_prob), 4),
+                    'Predicted_Winner': result['Home_Team'] if home_wins else result['Away_Team'],
+                    'Confidence': round(float(max(home_prob, away_prob)), 4),
+                })
+                results.append(result)
+            
+            return results
+    
+    def slate(self):
+        """Predictions for every game in todays_games.csv."""
+        with self.lock:
+            self.refresh()
+            games = self.games
+        matchups = [
+            (int(row.HOME_TEAM_ID), int(row.VISITOR_TEAM_ID), str(row.GAME_ID))
+            for row in games.itertuples(index=False)
+        ]
+        return self.predict(matchups)
+    
+    def status(self):
+        with self.lock:
+            self.refresh()
+            return {
+                'model': type(self.model).__name__,
+                'scaler': 'baked' if self.scaler is None else SCALER_PATH,
+                'cached_teams': len(self.windows),
+                'artifacts': {p: m for p, m in self.mtimes.items() if m is not None},
+            }
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """GET /predict, /slate and /health as JSON."""
+    
+    service = None
+    
+    def route(self, path, params):
+        """(status code, JSON body) for a request; bad parameters are a 400."""
+        if path == '/predict':
+            try:
+                home, away = params['home'][0], params['away'][0]
+            except KeyError as e:
+                return 400, {'error': f"Missing parameter: {e.args[0]}"}
+            try:
+                home, away = resolve_team(home), resolve_team(away)
+            except ValueError as e:
+                return 400, {'error': str(e)}
+            return 200, self.service.predict([(home, away, None)])[0]
+        if path == '/slate':
+            return 200, {'games': self.service.slate()}
+        if path == '/health':
+            return 200, self.service.status()
+        return 404, {'error': f"Unknown path: {path}"}
+    
+    def do_GET(self):
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        
+        try:
+            code, body = self.route(url.path, params)
+        except Exception as e:
+            # DB, artifact or model failures still answer in JSON
+            traceback.print_exc()
+            self.service.invalidate()
+            code, body = 500, {'error': f"{type(e).__name__}: {e}"}
+        
+        body['latency_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        payload = json.dumps(body, default=lambda o: o.item() if isinstance(o, np.generic) else str(o))
+        
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload.encode())
+    
+    def log_message(self, format, *args):
+        print(f"  {self.command} {self.path} -> {args[1] if len(args) > 1 else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve predictions from a warm model')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args()
+    
+    print("--- PREDICTION SERVER ---")
+    
+    if not os.path.exists(MODEL_PATH) and not os.path.exists(WEIGHTS_PATH):
+        print(f"[FAIL] Model not found: {MODEL_PATH}")
+        print("  Train the model in Colab first, then place files in models/")
+        return
+    if not os.path.exists(ROSTERS_FILE):
+        print(f"[FAIL] {ROSTERS_FILE} not found. Run fetch_rosters.py first.")
+        return
+    
+    PredictionHandler.service = PredictionService()
+    
+    # Warm the window cache with tonight's slate
+    start = time.perf_counter()
+    games = PredictionHandler.service.slate()
+    print(f"  Warmed {len(games)} games in {time.perf_counter() - start:.2f}s")
+    
+    server = ThreadingHTTPServer((args.host, args.port), PredictionHandler)
+    print(f"  Serving on http://{args.host}:{args.port} (/predict?home=&away=, /slate, /health)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n  Shutting down.")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
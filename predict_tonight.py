@@ -1,10 +1,30 @@
 """
 predict_tonight.py — BiLSTM+Attention Inference for Tonight's Games.
 
-Loads the trained BiLSTM+Attention model and scaler, queries the DB for each
+Loads the trained BiLSTM+Attention model (and scaler), queries the DB for each
 team's last 10 games, aggregates to team-level features (matching build_sequences.py),
 cross-references injuries to calculate missing_starter_minutes, and outputs
 win probabilities to final_predictions.csv.
+
+The model runs on the NumPy runtime (lstm_numpy.py) from models/lstm_weights.npz,
+so TensorFlow is not imported. The export carries the StandardScaler, so the
+runtime takes raw features and models/scaler.pkl (and sklearn) is only loaded
+for the Keras fallback, used when there is no up-to-date export.
+
+All sequences of the slate are built first, scaled together and scored in one
+forward pass. `--benchmark` also times the per-game path (one scaler call
+and one model.predict per team) against it.
+
+Each team's unscaled window and starter baseline are cached in
+models/window_cache.pkl, keyed by the roster's latest Game_ID: only teams
+whose players have played since the last run are rebuilt. Tonight's injury
+report is applied on top of the cached window at prediction time.
+
+Usage:
+    python predict_tonight.py
+    python predict_tonight.py --benchmark
+    python predict_tonight.py --rebuild-cache   # e.g. after build_sequences.py --full-rebuild
+    python predict_tonight.py --mc-samples 100  # MC dropout mean/std/interval columns
 """
 
 import pandas as pd
@@ -13,18 +33,20 @@ import numpy as np
 import os
 import datetime
 import json
+import time
 import joblib
+import argparse
 import unicodedata
 
-# Suppress TF warnings
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
-
-from tensorflow.keras.models import load_model
-
-# Import the custom Attention layer so Keras can deserialize the model
 import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from train_lstm import Attention
+from lstm_numpy import NumpyLSTMModel, WEIGHTS_FILE
+from build_sequences import (
+    aggregate_box_scores, games_in_window, missing_starter_minutes, load_game_context,
+)
+from data_loader import (
+    FEATURE_LOG_COLUMNS, ISO_DATE_COLUMN, compact_player_logs, select_columns, table_columns
+)
 
 # CONFIG
 DB_NAME = 'nba_stats.db'
@@ -32,6 +54,8 @@ MODELS_DIR = 'models'
 HISTORY_DIR = 'history'
 LOOKBACK = 10
 STARTER_MIN_THRESHOLD = 25
+WINDOW_CACHE_FILE = 'window_cache.pkl'  # Unscaled team windows (in MODELS_DIR)
+MC_INTERVAL = 0.90  # Central interval reported by --mc-samples (Home_Win_Prob_Lo/_Hi)
 
 # Must match build_sequences.py exactly
 FEATURE_COLUMNS = [
@@ -105,68 +129,116 @@ def get_schedule_context():
         return {}
 
 
-def build_team_sequence(team_id, rosters_df, conn, injured_names, schedule_ctx, is_home,
-                        game_context=None, elo_ratings=None):
-    """
-    Build the 10-game lookback sequence for a single team.
-    Returns a (10, 24) feature matrix, or None if insufficient data.
+def load_elo_ratings():
+    """Load current Elo ratings ({team_abbr: elo}), or {} when missing."""
+    elo_path = os.path.join(MODELS_DIR, 'elo_ratings.json')
+    try:
+        with open(elo_path) as f:
+            elo_ratings = json.load(f)
+        print(f"  Loaded Elo ratings ({len(elo_ratings)} teams)")
+        return elo_ratings
+    except Exception:
+        print("  [WARNING] Elo ratings not found. Using defaults.")
+        return {}
+
+
+def load_roster_logs(conn, rosters_df, team_ids):
     """
-    # Get player IDs for this team
-    team_players = rosters_df[rosters_df['TeamID'] == team_id]['PLAYER_ID'].unique()
+    Pull the recent player logs of every listed team's roster in one query.
     
-    if len(team_players) == 0:
-        return None
+    A team's last LOOKBACK + 7 games (the lookback plus its schedule context)
+    are each within the last LOOKBACK + 7 games of every roster player who
+    played in them, so each player's rows are cut to that window in SQL
+    (ROW_NUMBER over the (Player_ID, GAME_DATE_ISO) index, created by
+    data_loader.migrate_iso_dates; this function never writes). PLAYER_AVG_MIN,
+    the starter baseline, is averaged over the player's full history first.
     
-    # Fetch recent game logs for all players on this team
-    placeholders = ','.join(str(p) for p in team_players)
-    query = f"""
-        SELECT * FROM player_logs 
-        WHERE Player_ID IN ({placeholders})
-        ORDER BY GAME_DATE DESC
+    Returns {team_id: compact player-log DataFrame}, partitioned in memory.
     """
-    player_logs = pd.read_sql(query, conn)
+    roster = rosters_df[rosters_df['TeamID'].isin(team_ids)]
+    if roster.empty:
+        return {}
     
+    placeholders = ','.join(str(p) for p in roster['PLAYER_ID'].unique())
+    select = ', '.join(select_columns(conn, FEATURE_LOG_COLUMNS))
+    
+    if ISO_DATE_COLUMN in table_columns(conn):
+        query = f"""
+            SELECT * FROM (
+                SELECT {select},
+                       AVG(COALESCE(MIN, 0)) OVER (PARTITION BY Player_ID) AS PLAYER_AVG_MIN,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY Player_ID ORDER BY {ISO_DATE_COLUMN} DESC
+                       ) AS recent_rank,
+                       rowid AS log_rowid
+                FROM player_logs
+                WHERE Player_ID IN ({placeholders})
+            )
+            WHERE recent_rank <= {LOOKBACK + 7}
+            ORDER BY log_rowid
+        """
+    else:
+        # 'Apr 17, 2026' strings do not sort: keep every row
+        # (python data_loader.py --migrate-dates enables the cut)
+        query = f"""
+            SELECT {select},
+                   AVG(COALESCE(MIN, 0)) OVER (PARTITION BY Player_ID) AS PLAYER_AVG_MIN
+            FROM player_logs
+            WHERE Player_ID IN ({placeholders})
+            ORDER BY rowid
+        """
+    # Rows come back in table order, as in training, so float32 team means match
+    player_logs = pd.read_sql(query, conn).drop(
+        columns=['recent_rank', 'log_rowid'], errors='ignore'
+    )
     if player_logs.empty:
-        return None
+        return {}
     
-    # Compute advanced metrics
+    # Same compact schema as training: parsed dates, TEAM_ABBR / IS_HOME flags
+    player_logs = compact_player_logs(player_logs)
     player_logs = compute_advanced_metrics(player_logs)
-    
-    # Parse dates
-    player_logs['GAME_DATE_DT'] = pd.to_datetime(
-        player_logs['GAME_DATE'], format='mixed'
-    )
     player_logs['MIN_NUMERIC'] = pd.to_numeric(player_logs['MIN'], errors='coerce').fillna(0)
-    player_logs['IS_HOME'] = player_logs['MATCHUP'].apply(
-        lambda x: 1 if 'vs.' in str(x) else 0
-    )
+    
+    team_of_player = dict(zip(roster['PLAYER_ID'], roster['TeamID']))
+    return {
+        team_id: team_logs.reset_index(drop=True)
+        for team_id, team_logs in player_logs.groupby(
+            player_logs['Player_ID'].map(team_of_player), sort=False
+        )
+    }
+
+
+def build_team_window(team_id, rosters_df, conn, game_context=None, elo_ratings=None,
+                      player_logs=None):
+    """
+    Build the unscaled 10-game lookback window for a single team, before
+    tonight's injury override. `player_logs` is the team's partition from
+    load_roster_logs (queried here when not given).
+    Returns (window, starters): a (10, 24) feature matrix, or None if
+    insufficient data, and {Player_ID: average minutes} of the team's starters.
+    """
+    if player_logs is None:
+        player_logs = load_roster_logs(conn, rosters_df, [team_id]).get(team_id)
+    
+    if player_logs is None or player_logs.empty:
+        return None, {}
     
     # Get unique game IDs sorted by date (most recent first)
-    game_dates = player_logs.groupby('Game_ID')['GAME_DATE_DT'].first().sort_values(ascending=False)
+    game_dates = player_logs.groupby(
+        'Game_ID', observed=True
+    )['GAME_DATE_DT'].first().sort_values(ascending=False)
     
     # We need exactly LOOKBACK games, but may need more for schedule context calculation
     recent_game_ids = game_dates.head(LOOKBACK + 7).index.tolist()
     
-    if len(recent_game_ids) < LOOKBACK:
-        return None
-    
-    # Compute season-average minutes per player (for missing_starter_minutes)
-    player_avg_min = player_logs.groupby('Player_ID')['MIN_NUMERIC'].mean()
+    # Average minutes per player over all their games (for missing_starter_minutes)
+    player_avg_min = player_logs.groupby('Player_ID')['PLAYER_AVG_MIN'].first()
     starters = player_avg_min[player_avg_min >= STARTER_MIN_THRESHOLD]
     
-    # Calculate missing_starter_minutes for tonight
-    # Cross-reference injuries with starters
-    roster_names = rosters_df[rosters_df['TeamID'] == team_id][['PLAYER_ID', 'PLAYER']]
-    tonight_missing_min = 0.0
-    
-    for _, row in roster_names.iterrows():
-        pid = row['PLAYER_ID']
-        pname = normalize_name(row['PLAYER'])
-        if pname in injured_names and pid in starters.index:
-            tonight_missing_min += starters[pid]
+    if len(recent_game_ids) < LOOKBACK:
+        return None, starters.to_dict()
     
     # Build team-game features for the last LOOKBACK games
-    sequence_rows = []
     lookback_game_ids = recent_game_ids[:LOOKBACK]
     
     # Sort chronologically (oldest first) for the sequence
@@ -176,115 +248,324 @@ def build_team_sequence(team_id, rosters_df, conn, injured_names, schedule_ctx,
     all_dates_sorted = game_dates.sort_values(ascending=True)
     dates_list = all_dates_sorted.values
     
-    for g_idx, game_id in enumerate(lookback_game_ids):
-        game_logs = player_logs[player_logs['Game_ID'] == game_id]
-        
-        if game_logs.empty:
-            continue
-        
-        # Aggregate
-        row = {
-            'team_pts': game_logs['PTS'].sum(),
-            'team_reb': game_logs['REB'].sum(),
-            'team_ast': game_logs['AST'].sum(),
-            'team_stl': game_logs['STL'].sum(),
-            'team_blk': game_logs['BLK'].sum(),
-            'team_tov': game_logs['TOV'].sum(),
-            'max_pts': game_logs['PTS'].max(),
-            'max_reb': game_logs['REB'].max(),
-            'max_ast': game_logs['AST'].max(),
-            'fg_pct': game_logs['FG_PCT'].mean(),
-            'fg3_pct': game_logs['FG3_PCT'].mean(),
-            'ft_pct': game_logs['FT_PCT'].mean(),
-            'efg_pct': game_logs['EFG_PCT'].mean(),
-            'ts_pct': game_logs['TS_PCT'].mean(),
-            'tov_pct': game_logs['TOV_PCT'].mean(),
-            'plus_minus': game_logs['PLUS_MINUS'].mean(),
-            'is_home': game_logs['IS_HOME'].iloc[0],
-        }
-        
-        # Schedule context for this historical game
-        game_date = game_logs['GAME_DATE_DT'].iloc[0]
-        game_date_idx = np.searchsorted(dates_list, np.datetime64(game_date))
-        
-        if game_date_idx > 0:
-            prev_date = pd.Timestamp(dates_list[game_date_idx - 1])
-            rest = (game_date - prev_date).days
-        else:
-            rest = 3  # Default for first game
-        
-        row['rest_days'] = rest
-        row['is_back_to_back'] = 1 if rest == 1 else 0
-        
-        # Games in last 7 days for this historical game
-        seven_ago = game_date - pd.Timedelta(days=7)
-        g7 = sum(1 for d in dates_list[:game_date_idx] if pd.Timestamp(d) >= seven_ago)
-        row['games_last_7'] = g7
-        
-        # Missing starter minutes for historical games
-        played_ids = set(game_logs['Player_ID'].unique())
-        hist_missing = 0.0
-        for pid, avg_min in starters.items():
-            if pid not in played_ids:
-                hist_missing += avg_min
-        row['missing_starter_minutes'] = hist_missing
-        
-        # Elo and opponent strength context
-        # Get team abbreviation for context lookups
-        team_abbr = game_logs['MATCHUP'].iloc[0].split(' ')[0].strip()
-        if game_context and (game_id, team_abbr) in game_context:
-            ctx = game_context[(game_id, team_abbr)]
-            row['team_elo'] = ctx['team_elo']
-            row['opp_win_pct'] = ctx['opp_win_pct']
-            row['opp_pts_allowed_avg'] = ctx.get('opp_pts_allowed_avg', 105.0)
-        elif elo_ratings:
-            row['team_elo'] = elo_ratings.get(team_abbr, 1500)
-            row['opp_win_pct'] = 0.5
-            row['opp_pts_allowed_avg'] = 105.0
-        else:
-            row['team_elo'] = 1500
-            row['opp_win_pct'] = 0.5
-            row['opp_pts_allowed_avg'] = 105.0
-        
-        sequence_rows.append(row)
+    # Games in last 7 days for every lookback game in one sorted-array pass
+    lookback_g7 = games_in_window(dates_list, game_dates.loc[lookback_game_ids].values)
     
-    if len(sequence_rows) < LOOKBACK:
-        return None
+    # Missing starter minutes for the lookback games: starters anti-joined
+    # against each game's played set
+    lookback_missing = missing_starter_minutes(
+        pd.DataFrame({'Game_ID': lookback_game_ids}),
+        starters.rename('avg_min').rename_axis('Player_ID').reset_index(),
+        player_logs,
+        starter_keys=[],
+        played_keys=['Game_ID'],
+    )
     
-    # Override the most recent game's context with tonight's actual values
-    # The last entry in the sequence is the most recent historical game
-    # For the PREDICTION game (tonight), we inject tonight's context into
-    # the sequence as-is — the model was trained on historical sequences
-    # where each timestep has its own context.
+    # Elo context for just these games (primary-key lookup) unless one was passed in
+    if game_context is None:
+        game_context = load_game_context(conn, lookback_game_ids)
+    
+    # Box-score features for all lookback games in one grouped aggregation
+    # (the same kernel build_sequences uses for training)
+    lookback_logs = player_logs[player_logs['Game_ID'].isin(lookback_game_ids)]
+    games = aggregate_box_scores(
+        lookback_logs, 'Game_ID',
+        game_date=('GAME_DATE_DT', 'first'),
+        team_abbr=('TEAM_ABBR', 'first'),
+    ).loc[lookback_game_ids]
+    
+    # Schedule context: rest days since each game's predecessor
+    game_date_idx = np.searchsorted(dates_list, games['game_date'].values)
+    prev_dates = dates_list[np.maximum(game_date_idx - 1, 0)]
+    rest = (games['game_date'].values - prev_dates) // np.timedelta64(1, 'D')
+    games['rest_days'] = np.where(game_date_idx > 0, rest, 3)  # Default 3 for first game
+    games['is_back_to_back'] = (games['rest_days'] == 1).astype(int)
+    games['games_last_7'] = lookback_g7
+    games['missing_starter_minutes'] = lookback_missing
+    
+    # Elo and opponent strength context, falling back to current Elo ratings
+    team_abbrs = games['team_abbr'].astype(str)
+    context = pd.DataFrame.from_dict(game_context or {}, orient='index').reindex(
+        index=pd.MultiIndex.from_arrays([games.index.astype(str), team_abbrs]),
+        columns=['team_elo', 'opp_win_pct', 'opp_pts_allowed_avg'],
+    ).set_axis(games.index)
+    games['team_elo'] = context['team_elo'].fillna(team_abbrs.map(elo_ratings or {})).fillna(1500)
+    games['opp_win_pct'] = context['opp_win_pct'].fillna(0.5)
+    games['opp_pts_allowed_avg'] = context['opp_pts_allowed_avg'].fillna(105.0)
     
     # Build feature matrix (LOOKBACK x 24)
-    feature_matrix = np.array(
-        [[row[col] for col in FEATURE_COLUMNS] for row in sequence_rows],
-        dtype=np.float32
+    feature_matrix = games[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+    
+    return feature_matrix, starters.to_dict()
+
+
+def tonight_missing_minutes(team_id, rosters_df, injured_names, starters):
+    """Average minutes of the team's starters on tonight's injury report."""
+    # Cross-reference injuries with starters
+    roster = rosters_df[rosters_df['TeamID'] == team_id]
+    injured = roster['PLAYER'].map(normalize_name).isin(injured_names)
+    return float(sum(starters.get(pid, 0.0) for pid in roster.loc[injured, 'PLAYER_ID']))
+
+
+def apply_injury_override(window, missing_min):
+    """
+    Set the most recent game's missing_starter_minutes to tonight's value.
+    
+    The rule is always "write": the last timestep carries tonight's missing
+    starter minutes in place of that game's own, including 0 when nobody is
+    injured tonight, so the model never sees a stale absence from the last
+    game. predict_server.py and injury_scenarios.py go through this function
+    (or the same rule) for every sequence they score.
+    """
+    if window is None:
+        return window
+    window = window.copy()
+    window[-1, FEATURE_COLUMNS.index('missing_starter_minutes')] = missing_min
+    return window
+
+
+def build_team_sequence(team_id, rosters_df, conn, injured_names, schedule_ctx, is_home,
+                        game_context=None, elo_ratings=None, player_logs=None):
+    """
+    Build the 10-game lookback sequence for a single team, with tonight's
+    injury override applied.
+    Returns a (10, 24) feature matrix, or None if insufficient data.
+    """
+    window, starters = build_team_window(
+        team_id, rosters_df, conn, game_context=game_context,
+        elo_ratings=elo_ratings, player_logs=player_logs
     )
+    missing_min = tonight_missing_minutes(team_id, rosters_df, injured_names, starters)
+    return apply_injury_override(window, missing_min)
+
+
+def load_inference_model(model_path, weights_path):
+    """
+    NumPy runtime from the exported weights when they are at least as new as
+    the Keras model, otherwise the Keras model itself (imports TensorFlow).
+    """
+    if os.path.exists(weights_path) and (
+        not os.path.exists(model_path)
+        or os.path.getmtime(weights_path) >= os.path.getmtime(model_path)
+    ):
+        print(f"  Loading BiLSTM+Attention weights (NumPy runtime, {weights_path})...")
+        return NumpyLSTMModel(weights_path)
     
-    return feature_matrix
+    if os.path.exists(weights_path):
+        print(f"  [WARNING] {weights_path} is older than {model_path}; "
+              f"re-run lstm_numpy.py to export it")
+    
+    # Suppress TF warnings
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    from tensorflow.keras.models import load_model
+    # Import the custom Attention layer so Keras can deserialize the model
+    from train_lstm import Attention
+    
+    print("  Loading BiLSTM+Attention model (Keras)...")
+    return load_model(model_path, custom_objects={'Attention': Attention})
+
+
+def roster_cache_keys(conn, rosters_df, team_ids):
+    """
+    Window cache key per team: (latest Game_ID, number of logs, whether that
+    game has Elo context yet, roster) over the players on the team's roster.
+    A team's window only changes when one of those players plays (or their
+    logs are rewritten), its context is computed, or the roster changes, so
+    a matching key means the cached window is current.
+    """
+    roster = rosters_df[rosters_df['TeamID'].isin(team_ids)]
+    keys = {
+        int(team_id): (None, 0, False, tuple(sorted(int(p) for p in players)))
+        for team_id, players in roster.groupby('TeamID')['PLAYER_ID']
+    }
+    if roster.empty:
+        return keys
+    
+    # Latest log per player (by ISO date, or insertion order on an unmigrated DB)
+    latest = 'MAX(' + (ISO_DATE_COLUMN if ISO_DATE_COLUMN in table_columns(conn) else 'rowid') + ')'
+    placeholders = ','.join(str(p) for p in roster['PLAYER_ID'].unique())
+    player_latest = pd.read_sql(f"""
+        SELECT Player_ID, Game_ID, COUNT(*) AS n_logs, {latest} AS latest
+        FROM player_logs
+        WHERE Player_ID IN ({placeholders})
+        GROUP BY Player_ID
+    """, conn)
+    
+    team_of_player = dict(zip(roster['PLAYER_ID'], roster['TeamID']))
+    player_latest['TeamID'] = player_latest['Player_ID'].map(team_of_player)
+    newest = player_latest.loc[player_latest.groupby('TeamID')['latest'].idxmax()]
+    n_logs = player_latest.groupby('TeamID')['n_logs'].sum()
+    
+    # Windows built before feature_store.py added the latest game's context
+    # used the Elo fallback, so the key changes once the context exists
+    with_context = {gid for gid, _ in load_game_context(conn, newest['Game_ID'].astype(str))}
+    
+    for team_id, game_id in zip(newest['TeamID'], newest['Game_ID'].astype(str)):
+        players = keys[int(team_id)][-1]
+        keys[int(team_id)] = (game_id, int(n_logs[team_id]), game_id in with_context, players)
+    return keys
+
+
+def load_window_cache(path):
+    """Cached team windows ({team_id: entry}), or {} if missing or built for other features."""
+    try:
+        cache = joblib.load(path)
+    except Exception:
+        return {}
+    if cache.get('meta') != window_cache_meta():
+        print("  [WARNING] Window cache was built for other features. Rebuilding.")
+        return {}
+    return cache['teams']
+
+
+def save_window_cache(path, teams):
+    """Write the cache atomically (predict_server.py shares the file)."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    joblib.dump({'meta': window_cache_meta(), 'teams': teams}, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def window_cache_meta():
+    return {
+        'lookback': LOOKBACK,
+        'features': FEATURE_COLUMNS,
+        'starter_min_threshold': STARTER_MIN_THRESHOLD,
+    }
+
+
+def team_windows(conn, rosters_df, team_ids, cache, elo_ratings=None):
+    """
+    Unscaled windows and starter baselines for `team_ids`. Cache entries whose
+    key no longer matches the DB are evicted and rebuilt, all from one roster
+    query; `cache` is updated in place.
+    Returns ({team_id: (window, starters)}, list of rebuilt team IDs).
+    """
+    team_ids = [int(t) for t in team_ids]
+    keys = roster_cache_keys(conn, rosters_df, team_ids)
+    stale = [t for t in team_ids if t not in cache or cache[t]['key'] != keys.get(t)]
+    
+    if stale:
+        roster_logs = load_roster_logs(conn, rosters_df, stale)
+        for team_id in stale:
+            window, starters = build_team_window(
+                team_id, rosters_df, conn, elo_ratings=elo_ratings,
+                player_logs=roster_logs.get(team_id, pd.DataFrame())
+            )
+            cache[team_id] = {'key': keys.get(team_id), 'window': window, 'starters': starters}
+    
+    return {t: (cache[t]['window'], cache[t]['starters']) for t in team_ids}, stale
+
+
+def scale_sequences(scaler, X):
+    """
+    Scale a (n, LOOKBACK, 24) stack of sequences with one scaler call.
+    scaler=None means the model scales its own inputs (baked-in scaler).
+    """
+    if scaler is None:
+        return X
+    n, lookback, n_features = X.shape
+    return scaler.transform(X.reshape(-1, n_features)).reshape(n, lookback, n_features)
+
+
+def predict_per_game(model, scaler, sequences):
+    """Reference path: scale and predict each (LOOKBACK, 24) sequence on its own."""
+    return np.array([
+        model.predict(scale_sequences(scaler, seq[np.newaxis]), verbose=0)[0][0]
+        for seq in sequences
+    ])
+
+
+def predict_batch(model, scaler, sequences):
+    """Stack every sequence, scale once and run a single forward pass."""
+    X = scale_sequences(scaler, np.stack(sequences)).astype(np.float32)
+    return np.asarray(model(X, training=False)).reshape(-1)
+
+
+def mc_dropout_probs(model, scaler, sequences, n_samples, seed=None):
+    """
+    Monte Carlo dropout: n_samples stochastic forward passes over the slate,
+    tiled into one batch. Returns raw probabilities as (n_samples, n_sequences).
+    A Keras model is converted to the NumPy runtime in memory, so BatchNorm
+    keeps its moving statistics while dropout is active.
+    """
+    if not isinstance(model, NumpyLSTMModel):
+        model = NumpyLSTMModel.from_keras(model)
+    X = scale_sequences(scaler, np.stack(sequences)).astype(np.float32)
+    return model.sample(X, n_samples, rng=np.random.default_rng(seed))
+
+
+def mc_matchup_summary(home_samples, away_samples, interval=MC_INTERVAL):
+    """
+    Per-game mean, std and central interval of the normalized home win
+    probability over MC dropout samples (arrays of shape (n_samples, n_games)).
+    """
+    total = home_samples + away_samples
+    home_prob = np.where(total > 0, home_samples / np.where(total > 0, total, 1), 0.5)
+    tail = (1 - interval) / 2
+    lo, hi = np.quantile(home_prob, [tail, 1 - tail], axis=0)
+    return home_prob.mean(axis=0), home_prob.std(axis=0), lo, hi
+
+
+def normalize_matchup(home_raw, away_raw):
+    """Normalize the two teams' raw win probabilities to sum to 1 for the matchup."""
+    total = home_raw + away_raw
+    if total > 0:
+        return home_raw / total, away_raw / total
+    return 0.5, 0.5
+
+
+def benchmark(model, scaler, sequences, repeats=5):
+    """Print per-game vs batched latency for the slate (after one warm-up call each)."""
+    print(f"\n--- BENCHMARK ({len(sequences)} sequences, best of {repeats}) ---")
+    timings = {}
+    for name, fn in [('per-game', predict_per_game), ('batched', predict_batch)]:
+        probs = fn(model, scaler, sequences)
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn(model, scaler, sequences)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = (best, probs)
+        print(f"  {name:<9} {best * 1000:8.1f} ms")
+    
+    per_game, batched = timings['per-game'], timings['batched']
+    print(f"  Speedup:  {per_game[0] / batched[0]:.1f}x  "
+          f"(max |diff| {np.abs(per_game[1] - batched[1]).max():.2e})")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Predict tonight's games")
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Time per-game vs batched inference for the slate')
+    parser.add_argument('--rebuild-cache', action='store_true',
+                        help='Ignore the team window cache and rebuild every window')
+    parser.add_argument('--mc-samples', type=int, default=0, metavar='K',
+                        help='Add MC dropout uncertainty from K samples (one batched pass)')
+    parser.add_argument('--mc-seed', type=int, default=None,
+                        help='Random seed for the MC dropout masks')
+    args = parser.parse_args()
+    
     print("--- PREDICTING TONIGHT (LSTM) ---")
     
     # 1. Pre-flight checks
     model_path = os.path.join(MODELS_DIR, 'lstm_model.keras')
+    weights_path = os.path.join(MODELS_DIR, WEIGHTS_FILE)
     scaler_path = os.path.join(MODELS_DIR, 'scaler.pkl')
     
-    if not os.path.exists(model_path):
+    if not os.path.exists(model_path) and not os.path.exists(weights_path):
         print(f"[FAIL] Model not found: {model_path}")
         print("  Train the model in Colab first, then place files in models/")
         return
-    if not os.path.exists(scaler_path):
-        print(f"[FAIL] Scaler not found: {scaler_path}")
-        return
     
-    # 2. Load model and scaler
-    print("  Loading BiLSTM+Attention model...")
-    model = load_model(model_path, custom_objects={'Attention': Attention})
-    scaler = joblib.load(scaler_path)
+    # 2. Load model and scaler (unless it is baked into the NumPy export)
+    model = load_inference_model(model_path, weights_path)
+    scaler = None
+    if not getattr(model, 'scales_inputs', False):
+        if not os.path.exists(scaler_path):
+            print(f"[FAIL] Scaler not found: {scaler_path}")
+            return
+        scaler = joblib.load(scaler_path)
     
     # 3. Load game data
     games = pd.read_csv('todays_games.csv')
@@ -298,23 +579,25 @@ def main():
     injured_names = get_injured_player_names()
     schedule_ctx = get_schedule_context()
     
-    # Load Elo/strength context for lookback features
-    game_context = {}
-    elo_ratings = {}
-    context_path = os.path.join(MODELS_DIR, 'game_context.pkl')
-    elo_path = os.path.join(MODELS_DIR, 'elo_ratings.json')
-    try:
-        game_context = joblib.load(context_path)
-        with open(elo_path) as f:
-            elo_ratings = json.load(f)
-        print(f"  Loaded Elo context ({len(elo_ratings)} teams, {len(game_context)} game-team pairs)")
-    except Exception:
-        print("  [WARNING] Elo context files not found. Using defaults.")
+    # Load current Elo ratings; per-game lookback context is read from the
+    # game_context table for each team's lookback games only
+    elo_ratings = load_elo_ratings()
     
     conn = sqlite3.connect(DB_NAME)
     
-    # 5. Generate predictions for each matchup
-    predictions = []
+    # 5. Team windows: cached on disk until one of the team's players plays
+    # again; only stale teams are rebuilt (from one roster query)
+    team_ids = pd.concat([games['HOME_TEAM_ID'], games['VISITOR_TEAM_ID']]).unique()
+    cache_path = os.path.join(MODELS_DIR, WINDOW_CACHE_FILE)
+    cache = {} if args.rebuild_cache else load_window_cache(cache_path)
+    windows, rebuilt = team_windows(conn, rosters, team_ids, cache, elo_ratings=elo_ratings)
+    save_window_cache(cache_path, cache)
+    conn.close()
+    print(f"  Team windows: {len(rebuilt)} rebuilt, {len(team_ids) - len(rebuilt)} cached "
+          f"({cache_path})")
+    
+    slate = []        # (game_id, home_name, away_name) per scored matchup
+    sequences = []    # home, away, home, away, ...
     
     for _, game_row in games.iterrows():
         game_id = game_row['GAME_ID']
@@ -324,44 +607,45 @@ def main():
         home_name = get_team_name(home_id)
         away_name = get_team_name(away_id)
         
-        print(f"\n  {away_name} @ {home_name}")
-        
-        # Build sequences for both teams
-        home_seq = build_team_sequence(
-            home_id, rosters, conn, injured_names, schedule_ctx, is_home=1,
-            game_context=game_context, elo_ratings=elo_ratings
+        # Both teams' windows with tonight's injury override on top
+        home_window, home_starters = windows[int(home_id)]
+        away_window, away_starters = windows[int(away_id)]
+        home_seq = apply_injury_override(
+            home_window, tonight_missing_minutes(home_id, rosters, injured_names, home_starters)
         )
-        away_seq = build_team_sequence(
-            away_id, rosters, conn, injured_names, schedule_ctx, is_home=0,
-            game_context=game_context, elo_ratings=elo_ratings
+        away_seq = apply_injury_override(
+            away_window, tonight_missing_minutes(away_id, rosters, injured_names, away_starters)
         )
         
         if home_seq is None or away_seq is None:
-            print(f"    [SKIP] Insufficient data for this matchup.")
+            print(f"\n  [SKIP] {away_name} @ {home_name}: insufficient data for this matchup.")
             continue
         
-        # Scale features
-        n_features = home_seq.shape[1]
-        home_scaled = scaler.transform(
-            home_seq.reshape(-1, n_features)
-        ).reshape(1, LOOKBACK, n_features)
-        
-        away_scaled = scaler.transform(
-            away_seq.reshape(-1, n_features)
-        ).reshape(1, LOOKBACK, n_features)
-        
-        # Predict (outputs win probability directly via sigmoid)
-        home_raw = model.predict(home_scaled, verbose=0)[0][0]
-        away_raw = model.predict(away_scaled, verbose=0)[0][0]
-        
-        # Normalize probabilities to sum to 1 for the matchup
-        total = home_raw + away_raw
-        if total > 0:
-            home_prob = home_raw / total
-            away_prob = away_raw / total
-        else:
-            home_prob = 0.5
-            away_prob = 0.5
+        slate.append((game_id, home_name, away_name))
+        sequences += [home_seq, away_seq]
+    
+    # 6. Score the whole slate in one forward pass (sigmoid win probabilities)
+    predictions = []
+    raw_probs = np.empty(0)
+    if slate:
+        if args.benchmark:
+            benchmark(model, scaler, sequences)
+        raw_probs = predict_batch(model, scaler, sequences)
+        print(f"\n  Scored {len(sequences)} sequences in one batch.")
+    
+    # Optional MC dropout uncertainty: K x slate sequences in one forward pass
+    mc = None
+    if slate and args.mc_samples > 0:
+        try:
+            samples = mc_dropout_probs(model, scaler, sequences, args.mc_samples, args.mc_seed)
+            mc = mc_matchup_summary(samples[:, 0::2], samples[:, 1::2])
+            print(f"  MC dropout: {args.mc_samples} samples x {len(sequences)} sequences "
+                  f"in one batch ({MC_INTERVAL:.0%} interval).")
+        except ValueError as e:
+            print(f"  [WARNING] MC dropout skipped: {e}")
+    
+    for i, (game_id, home_name, away_name) in enumerate(slate):
+        home_prob, away_prob = normalize_matchup(raw_probs[2 * i], raw_probs[2 * i + 1])
         
         # Determine winner and confidence
         if home_prob > away_prob:
@@ -371,11 +655,12 @@ def main():
             predicted_winner = away_name
             confidence = away_prob
         
+        print(f"\n  {away_name} @ {home_name}")
         print(f"    Home ({home_name}): {home_prob:.1%}")
         print(f"    Away ({away_name}): {away_prob:.1%}")
         print(f"    -> {predicted_winner} ({confidence:.1%})")
         
-        predictions.append({
+        prediction = {
             'GAME_ID': game_id,
             'Home_Team': home_name,
             'Away_Team': away_name,
@@ -383,11 +668,22 @@ def main():
             'Away_Win_Prob': round(away_prob, 4),
             'Predicted_Winner': predicted_winner,
             'Confidence': round(confidence, 4),
-        })
-    
-    conn.close()
+        }
+        
+        if mc is not None:
+            mean, std, lo, hi = (float(stat[i]) for stat in mc)
+            print(f"    MC dropout: home {mean:.1%} ± {std:.1%} "
+                  f"({MC_INTERVAL:.0%} interval {lo:.1%}-{hi:.1%})")
+            prediction.update({
+                'Home_Win_Prob_Mean': round(mean, 4),
+                'Home_Win_Prob_Std': round(std, 4),
+                'Home_Win_Prob_Lo': round(lo, 4),
+                'Home_Win_Prob_Hi': round(hi, 4),
+            })
+        
+        predictions.append(prediction)
     
-    # 6. Save predictions
+    # 7. Save predictions
     if predictions:
         today_str = datetime.date.today().strftime("%Y-%m-%d")
         pred_df = pd.DataFrame(predictions)
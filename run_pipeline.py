@@ -2,6 +2,7 @@ import os
 import sys
 import subprocess
 import datetime
+import numpy as np
 
 # CONFIG
 HISTORY_DIR = "history"
@@ -44,17 +45,26 @@ def run_script(script_name, args=[]):
 def check_model_exists():
     """Pre-flight check: ensure LSTM model artifacts are present."""
     model_path = os.path.join(MODELS_DIR, 'lstm_model.keras')
+    weights_path = os.path.join(MODELS_DIR, 'lstm_weights.npz')
     scaler_path = os.path.join(MODELS_DIR, 'scaler.pkl')
     
-    if not os.path.exists(model_path):
+    if not os.path.exists(model_path) and not os.path.exists(weights_path):
         log(f"MODEL NOT FOUND: {model_path}")
         log("Train the model in Colab first, then place files in models/")
         return False
-    if not os.path.exists(scaler_path):
+    # The NumPy export normally carries the scaler itself
+    scaler_baked = False
+    if os.path.exists(weights_path):
+        with np.load(weights_path) as weights:
+            scaler_baked = 'scaler_mean' in weights.files
+    if not scaler_baked and not os.path.exists(scaler_path):
         log(f"SCALER NOT FOUND: {scaler_path}")
         return False
     
-    log(f"Model found: {model_path}")
+    if not os.path.exists(weights_path):
+        log(f"No {weights_path}: predictions will load TensorFlow "
+            f"(run lstm_numpy.py to export the NumPy weights)")
+    log(f"Model found: {weights_path if os.path.exists(weights_path) else model_path}")
     return True
 
 def main():
@@ -83,8 +93,12 @@ def main():
         log("Stats fetch failed. Aborting.")
         return
 
+    log(">>> STEP 5: Applying new results to features and Elo...")
+    if not run_script("feature_store.py"):
+        log("Feature/Elo refresh failed. Predicting with the previous Elo context.")
+
     # 3. Generate Predictions
-    log(">>> STEP 5: Running LSTM predictions...")
+    log(">>> STEP 6: Running LSTM predictions...")
     if not run_script("predict_tonight.py"):
         log("Prediction failed.")
         return
@@ -0,0 +1,404 @@
+"""
+sweep.py — Hyperparameter sweep of train_lstm.build_model with successive halving.
+
+Trials are drawn (seeded) from a search space over the build_model arguments
+and the batch size. Successive halving runs them in rungs: every live trial
+trains to the rung's epoch budget, the best 1/eta by final-epoch validation
+loss survive, and the budget grows by eta. A survivor resumes from its previous rung's
+checkpoint instead of starting over.
+
+Each rung of each trial runs in a worker process (TensorFlow bounded to
+--threads, as in walk_forward.py) and leaves in sweep/trials/<trial>/:
+    rung<k>.keras   checkpoint (with optimizer state) the next rung resumes from
+    rung<k>.npz     lstm_numpy export, used to time inference
+    rung<k>.json    params, epochs, val_loss history, final-epoch val AUC; written last
+A rung whose .json exists is never rerun, so an interrupted sweep resumes
+where it stopped. Trial IDs hash the parameters and the training data
+(labels, a strided sample of window values and per-feature sums), so
+rebuilt data, including a feature change, starts fresh trials.
+
+Inference latency is timed in this process, serially, on the NumPy runtime
+predict_tonight.py uses: the median time to score one game (two sequences).
+The report lists every rung each trial completed and marks, per rung, the
+Pareto front of validation AUC against latency: trials are only compared
+at the same epoch budget, so trials cut at an early rung do not crowd out
+fully trained ones.
+
+Data is the same split train_lstm.py trains on: X_train/X_val .npy windows,
+or an index dataset with --dataset.
+
+Output:
+    sweep/trials.csv    one row per trial and completed rung, per-rung Pareto front flagged
+
+Usage:
+    python sweep.py                                  # default space, 27 trials
+    python sweep.py --space space.json --trials 40 --workers 4 --threads 2
+    python sweep.py --dataset dataset --min-epochs 2 --eta 3
+"""
+
+import pandas as pd
+import numpy as np
+import os
+import json
+import time
+import hashlib
+import itertools
+import argparse
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
+
+from lstm_numpy import NumpyLSTMModel
+from walk_forward import THREADS_PER_WORKER, bound_tf_threads
+
+# CONFIG
+SWEEP_DIR = "sweep"
+N_TRIALS = 27
+ETA = 3           # Keep the best 1/ETA of trials per rung; multiply the epoch budget by ETA
+MIN_EPOCHS = 3    # Epoch budget of the first rung
+MAX_EPOCHS = 100
+LATENCY_REPEATS = 200
+FINGERPRINT_SAMPLE = 4096  # Windows per split whose values are hashed into trial IDs
+SEED = 42
+
+# build_model() arguments plus the batch size; --space replaces it with a JSON
+# object of the same shape (parameter -> list of values)
+SEARCH_SPACE = {
+    'lstm_units': [[64, 32], [32, 16], [128, 64], [64]],
+    'dense_units': [16, 32],
+    'dropout': [0.2, 0.4],
+    'l2_reg': [0.0, 0.001],
+    'learning_rate': [0.001, 0.0003],
+    'batch_size': [32, 128],
+}
+# Values of parameters a search space leaves out (train_lstm.py's defaults)
+DEFAULT_PARAMS = {
+    'lstm_units': [64, 32],
+    'dense_units': 16,
+    'dropout': 0.4,
+    'dense_dropout': 0.2,
+    'l2_reg': 0.001,
+    'learning_rate': 0.001,
+    'batch_size': 32,
+}
+
+# Set in each worker by init_worker()
+_data = None
+
+
+def load_split(dataset=None):
+    """
+    (train_windows, train_starts, y_train, val_windows, val_starts, y_val) as
+    train_lstm.py reads them: memory-mapped X/y .npy windows, or the index
+    dataset's sliding windows over its scaled matrix.
+    """
+    if dataset:
+        from train_lstm import index_windows, load_index_dataset
+        features, splits, lookback = load_index_dataset(dataset)
+        windows = index_windows(features, lookback)
+        (train_starts, y_train), (val_starts, y_val) = splits['train'], splits['val']
+        return windows, train_starts, y_train, windows, val_starts, y_val
+    
+    X_train = np.load('X_train.npy', mmap_mode='r')
+    X_val = np.load('X_val.npy', mmap_mode='r')
+    y_train = np.load('y_train.npy')
+    y_val = np.load('y_val.npy')
+    return X_train, np.arange(len(X_train)), y_train, X_val, np.arange(len(X_val)), y_val
+
+
+def data_fingerprint(data, sample=FINGERPRINT_SAMPLE):
+    """
+    Short hash of the split, part of every trial ID: shapes, starts and
+    labels, the feature values of up to `sample` evenly strided windows per
+    split, and per-feature sums over every window, so rebuilt features with
+    unchanged shapes and labels still change it.
+    """
+    train_windows, train_starts, y_train, val_windows, val_starts, y_val = data
+    digest = hashlib.sha1(str((train_windows.shape, len(train_starts), len(val_starts))).encode())
+    for arr in (train_starts, y_train, val_starts, y_val):
+        digest.update(np.ascontiguousarray(arr).tobytes())
+    
+    for windows, starts in [(train_windows, train_starts), (val_windows, val_starts)]:
+        if not len(starts):
+            continue
+        strided = starts[np.unique(np.linspace(0, len(starts) - 1, sample).astype(np.int64))]
+        digest.update(np.ascontiguousarray(windows[strided], dtype=np.float32).tobytes())
+        sums = np.zeros(windows.shape[-1], dtype=np.float64)
+        for i in range(0, len(starts), 4096):
+            sums += windows[starts[i:i + 4096]].sum(axis=(0, 1), dtype=np.float64)
+        digest.update(sums.tobytes())
+    return digest.hexdigest()[:8]
+
+
+def sample_trials(space, n_trials, seed=SEED):
+    """n_trials distinct parameter dicts from the grid of `space` (all of it if smaller)."""
+    names = sorted(space)
+    grid = list(itertools.product(*(space[name] for name in names)))
+    if len(grid) > n_trials:
+        picks = np.random.default_rng(seed).choice(len(grid), n_trials, replace=False)
+        grid = [grid[i] for i in sorted(picks)]
+    return [dict(zip(names, values)) for values in grid]
+
+
+def trial_id(params, fingerprint):
+    """Stable ID from the parameters and the data fingerprint."""
+    key = json.dumps(params, sort_keys=True) + fingerprint
+    return hashlib.sha1(key.encode()).hexdigest()[:10]
+
+
+def rung_path(sweep_dir, tid, rung, ext):
+    return os.path.join(sweep_dir, 'trials', tid, f"rung{rung}.{ext}")
+
+
+def load_rung(sweep_dir, tid, rung):
+    """The cached result of a finished rung, or None."""
+    path = rung_path(sweep_dir, tid, rung, 'json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        result = json.load(f)
+    # Rank on the final epoch (older rung files stored the best epoch's loss)
+    result['val_loss'] = result['val_loss_history'][-1]
+    return result
+
+
+def init_worker(dataset, threads):
+    """Pool initializer: bound TensorFlow's threads and memory-map the split once."""
+    global _data
+    bound_tf_threads(threads)
+    _data = load_split(dataset)
+
+
+def run_rung(sweep_dir, tid, params, rung, epochs):
+    """
+    Train trial `tid` to `epochs` total epochs, resuming from its previous
+    rung's checkpoint, and write the rung's checkpoint, export and result.
+    Runs in a worker. Returns the result dict.
+    """
+    from sklearn.metrics import roc_auc_score
+    from tensorflow import keras
+    from tensorflow.keras.models import load_model
+    from lstm_numpy import export_weights
+    from train_lstm import Attention, WindowSequence, build_model, class_weights_for
+    
+    train_windows, train_starts, y_train, val_windows, val_starts, y_val = _data
+    batch_size = params['batch_size']
+    
+    keras.utils.set_random_seed((int(tid, 16) + rung) % 2**31)
+    previous = load_rung(sweep_dir, tid, rung - 1) if rung > 0 else None
+    if previous is not None:
+        model = load_model(rung_path(sweep_dir, tid, rung - 1, 'keras'),
+                           custom_objects={'Attention': Attention})
+        initial_epoch, val_losses = previous['epochs'], previous['val_loss_history']
+    else:
+        arch = {k: v for k, v in params.items() if k != 'batch_size'}
+        arch['lstm_units'] = tuple(arch['lstm_units'])
+        model = build_model(train_windows.shape[1:], **arch)
+        initial_epoch, val_losses = 0, []
+    
+    train_data = WindowSequence(train_windows, train_starts, y_train, batch_size,
+                                class_weights=class_weights_for(y_train), shuffle=True)
+    val_data = WindowSequence(val_windows, val_starts, y_val, batch_size)
+    
+    start = time.perf_counter()
+    history = model.fit(train_data, validation_data=val_data, epochs=epochs,
+                        initial_epoch=initial_epoch, verbose=0)
+    val_losses = val_losses + [float(v) for v in history.history['val_loss']]
+    
+    # Selection, AUC, export and the next rung's resume all use these final-epoch weights
+    auc = float(roc_auc_score(y_val, model.predict(val_data, verbose=0).ravel()))
+    
+    model.save(rung_path(sweep_dir, tid, rung, 'keras'))
+    export_weights(model, rung_path(sweep_dir, tid, rung, 'npz'))
+    
+    result = {
+        'trial': tid,
+        'params': params,
+        'rung': rung,
+        'epochs': epochs,
+        'val_loss': val_losses[-1],
+        'val_loss_history': val_losses,
+        'val_auc': auc,
+        'train_seconds': time.perf_counter() - start,
+    }
+    # The .json marks the rung finished: write it last, atomically
+    path = rung_path(sweep_dir, tid, rung, 'json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(result, f, indent=2)
+    os.replace(path + '.tmp', path)
+    return result
+
+
+def rung_budgets(n_trials, eta=ETA, min_epochs=MIN_EPOCHS, max_epochs=MAX_EPOCHS):
+    """(trials kept, epoch budget) per rung, until one trial or max_epochs remains."""
+    budgets = [(n_trials, min(min_epochs, max_epochs))]
+    while budgets[-1][0] > 1 and budgets[-1][1] < max_epochs:
+        kept, epochs = budgets[-1]
+        budgets.append((max(1, kept // eta), min(epochs * eta, max_epochs)))
+    return budgets
+
+
+def successive_halving(trials, sweep_dir, pool, budgets):
+    """
+    Run the rungs, skipping any rung result already on disk. `trials` maps
+    trial ID -> params. Returns every rung result, in rung order.
+    """
+    latest = {}
+    completed = []
+    alive = list(trials)
+    
+    for rung, (kept, epochs) in enumerate(budgets):
+        alive = sorted(alive, key=lambda t: latest[t]['val_loss'])[:kept] if rung else alive
+        
+        results = {t: load_rung(sweep_dir, t, rung) for t in alive}
+        todo = [t for t in alive if results[t] is None]
+        print(f"\n  Rung {rung}: {len(alive)} trials to {epochs} epochs "
+              f"({len(alive) - len(todo)} cached)")
+        
+        futures = {}
+        for t in todo:
+            os.makedirs(os.path.join(sweep_dir, 'trials', t), exist_ok=True)
+            futures[t] = pool.submit(run_rung, sweep_dir, t, trials[t], rung, epochs)
+        for t, future in futures.items():
+            results[t] = future.result()
+            print(f"    {t}  val_loss {results[t]['val_loss']:.4f}  "
+                  f"AUC {results[t]['val_auc']:.4f}  ({results[t]['train_seconds']:.1f}s)")
+        
+        latest.update(results)
+        completed += [results[t] for t in alive]
+    
+    return completed
+
+
+class SerialPool:
+    """Stand-in for ProcessPoolExecutor with --workers 1: runs each job on submit."""
+    
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+def inference_latency_ms(weights_path, input_shape, repeats=LATENCY_REPEATS):
+    """Median milliseconds for the NumPy runtime to score one game (two sequences)."""
+    model = NumpyLSTMModel(weights_path)
+    X = np.random.default_rng(0).standard_normal((2,) + tuple(input_shape)).astype(np.float32)
+    model(X)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def pareto_front(auc, latency):
+    """Mask of trials no other trial beats on both AUC (higher) and latency (lower)."""
+    order = np.lexsort((-auc, latency))
+    front = np.zeros(len(auc), dtype=bool)
+    best = -np.inf
+    for i in order:
+        if auc[i] > best:
+            front[i] = True
+            best = auc[i]
+    return front
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hyperparameter sweep with successive halving')
+    parser.add_argument('--space', help='JSON search space (parameter -> list of values)')
+    parser.add_argument('--trials', type=int, default=N_TRIALS)
+    parser.add_argument('--eta', type=int, default=ETA)
+    parser.add_argument('--min-epochs', type=int, default=MIN_EPOCHS)
+    parser.add_argument('--max-epochs', type=int, default=MAX_EPOCHS)
+    parser.add_argument('--dataset', default=None,
+                        help='Index dataset directory (build_sequences.py --format index)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Trial processes (default: cores / --threads)')
+    parser.add_argument('--threads', type=int, default=THREADS_PER_WORKER,
+                        help=f'TensorFlow threads per worker (default: {THREADS_PER_WORKER})')
+    parser.add_argument('--out', default=SWEEP_DIR)
+    args = parser.parse_args()
+    
+    workers = args.workers or max(1, (os.cpu_count() or 1) // args.threads)
+    
+    print("=" * 60)
+    print("  HYPERPARAMETER SWEEP — SUCCESSIVE HALVING")
+    print("=" * 60)
+    
+    space = SEARCH_SPACE
+    if args.space:
+        with open(args.space) as f:
+            space = json.load(f)
+    unknown = set(space) - set(DEFAULT_PARAMS)
+    if unknown:
+        print(f"[FAIL] Unknown parameters in the search space: {sorted(unknown)}")
+        return
+    space = {**{k: [v] for k, v in DEFAULT_PARAMS.items()}, **space}
+    
+    # 1. Trials, keyed by parameters and data
+    data = load_split(args.dataset)
+    input_shape = data[0].shape[1:]
+    fingerprint = data_fingerprint(data)
+    trials = {trial_id(p, fingerprint): p for p in sample_trials(space, args.trials)}
+    budgets = rung_budgets(len(trials), args.eta, args.min_epochs, args.max_epochs)
+    
+    print(f"  {len(trials)} trials on {len(data[1])} train / {len(data[4])} val windows "
+          f"(data {fingerprint})")
+    print("  Rungs (trials, epochs): " + ", ".join(f"({k}, {e})" for k, e in budgets))
+    
+    # 2. Successive halving across worker processes
+    start_time = time.perf_counter()
+    if workers <= 1:
+        init_worker(args.dataset, args.threads)
+        completed = successive_halving(trials, args.out, SerialPool(), budgets)
+    else:
+        print(f"  {workers} worker processes ({args.threads} TF threads each)")
+        # spawn: workers must not inherit a forked TensorFlow/OpenMP runtime
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                                 initializer=init_worker,
+                                 initargs=(args.dataset, args.threads)) as pool:
+            completed = successive_halving(trials, args.out, pool, budgets)
+    print(f"\n  Sweep finished in {time.perf_counter() - start_time:.1f}s")
+    
+    # 3. Latency per trial (the architecture does not change across rungs),
+    # timed serially here on its first checkpoint
+    latency = {
+        tid: inference_latency_ms(rung_path(args.out, tid, 0, 'npz'), input_shape)
+        for tid in trials
+    }
+    
+    rows = []
+    for result in completed:
+        rows.append({
+            'trial': result['trial'],
+            'rung': result['rung'],
+            'epochs': result['epochs'],
+            'val_loss': result['val_loss'],
+            'val_auc': result['val_auc'],
+            'latency_ms': latency[result['trial']],
+            **{k: json.dumps(v) if isinstance(v, list) else v for k, v in result['params'].items()},
+        })
+    
+    # Pareto fronts per rung: only trials trained to the same budget are compared
+    table = pd.DataFrame(rows)
+    table['pareto'] = False
+    for _, rung in table.groupby('rung'):
+        table.loc[rung.index, 'pareto'] = pareto_front(
+            rung['val_auc'].to_numpy(), rung['latency_ms'].to_numpy()
+        )
+    table = table.sort_values(['rung', 'val_loss'], ascending=[False, True]).reset_index(drop=True)
+    
+    path = os.path.join(args.out, 'trials.csv')
+    table.to_csv(path, index=False, float_format='%.5f')
+    print(f"  [SAVED] {path}")
+    
+    for rung, group in table.groupby('rung', sort=False):
+        print(f"\n  Pareto front, rung {rung} ({len(group)} trials at {group['epochs'].iloc[0]} "
+              f"epochs): validation AUC vs. latency per game")
+        front = group[group['pareto']].sort_values('latency_ms')
+        print(front.drop(columns=['rung', 'epochs', 'pareto']).to_string(
+            index=False, float_format=lambda x: f"{x:.4f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,15 +15,30 @@ Evaluation: Accuracy, AUC, Classification Report
 Usage (Colab):
     1. Upload X_train.npy, X_val.npy, y_train.npy, y_val.npy, models/scaler.pkl
     2. Run this script
-    3. Download models/lstm_model.keras and models/scaler.pkl
+    3. Download models/lstm_model.keras, models/lstm_weights.npz and models/scaler.pkl
 
 Usage (Local quick test):
     python train_lstm.py --epochs 5
+
+Usage (index dataset from build_sequences.py --format index):
+    python train_lstm.py --dataset dataset
+    Upload dataset/ instead of the X/y .npy files; windows are assembled per
+    batch from the memory-mapped team-game matrix.
+
+Usage (streaming, for datasets larger than RAM):
+    python train_lstm.py --stream                     # memory-mapped X/y .npy windows
+    python train_lstm.py --stream --dataset dataset   # memory-mapped index dataset
+    A tf.data pipeline shuffles window offsets, batches them and gathers the
+    windows in a parallel map with prefetching, so only a few batches are
+    resident while the model trains.
 """
 
 import numpy as np
 import os
+import json
+import joblib
 import argparse
+from numpy.lib.stride_tricks import sliding_window_view
 
 # Suppress TF warnings for cleaner output
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
@@ -39,9 +54,12 @@ from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
 from tensorflow.keras.regularizers import l2
 from sklearn.metrics import classification_report, roc_auc_score
 
+from lstm_numpy import export_weights, SCALER_FILE, WEIGHTS_FILE
+
 # CONFIG
 MODELS_DIR = "models"
 BATCH_SIZE = 32
+SHUFFLE_BUFFER = 10000  # window offsets (not windows) held by the --stream shuffle
 DEFAULT_EPOCHS = 100
 LEARNING_RATE = 0.001
 
@@ -92,38 +110,145 @@ class Attention(Layer):
         return super(Attention, self).get_config()
 
 
-def build_model(input_shape):
+def index_windows(features, lookback):
+    """Zero-copy (rows - lookback + 1, lookback, features) view of every window."""
+    return sliding_window_view(features, (lookback, features.shape[1]))[:, 0]
+
+
+def sample_weights_for(labels, class_weights):
+    """Per-sample weights equivalent to Keras' class_weight."""
+    return np.where(labels == 1, class_weights[1], class_weights[0]).astype(np.float32)
+
+
+class WindowSequence(keras.utils.Sequence):
+    """
+    Batches of lookback windows gathered as windows[starts[batch]]. `windows`
+    is a sliding view of a (possibly memory-mapped) team-game matrix, so only
+    one batch is materialized at a time.
+    
+    With class_weights, batches carry per-sample weights (Keras applies
+    class_weight the same way). With shuffle, window order is reshuffled
+    every epoch.
+    """
+    
+    def __init__(self, windows, starts, labels, batch_size,
+                 class_weights=None, shuffle=False, **kwargs):
+        super(WindowSequence, self).__init__(**kwargs)
+        self.windows = windows
+        self.starts = np.asarray(starts)
+        self.labels = np.asarray(labels, dtype=np.float32)
+        self.batch_size = batch_size
+        self.sample_weights = None
+        if class_weights is not None:
+            self.sample_weights = sample_weights_for(self.labels, class_weights)
+        self.shuffle = shuffle
+        self.order = np.arange(len(self.starts))
+        self.on_epoch_end()
+    
+    def __len__(self):
+        return int(np.ceil(len(self.starts) / self.batch_size))
+    
+    def __getitem__(self, idx):
+        batch = self.order[idx * self.batch_size:(idx + 1) * self.batch_size]
+        X = self.windows[self.starts[batch]]
+        if self.sample_weights is None:
+            return X, self.labels[batch]
+        return X, self.labels[batch], self.sample_weights[batch]
+    
+    def on_epoch_end(self):
+        if self.shuffle:
+            np.random.shuffle(self.order)
+
+
+def make_stream(windows, starts, labels, batch_size, class_weights=None, shuffle=False,
+                shuffle_buffer=SHUFFLE_BUFFER):
+    """
+    tf.data pipeline yielding (X, y[, sample_weight]) batches of windows[starts].
+    
+    Only the small offset/label/weight columns enter the pipeline: they are
+    shuffled (reshuffled every epoch) and batched, then a parallel map gathers
+    each batch of windows from the memory-mapped source and prefetch keeps
+    batches ready while the model trains.
+    """
+    labels = np.asarray(labels, dtype=np.float32)
+    columns = (np.asarray(starts, dtype=np.int64), labels)
+    if class_weights is not None:
+        columns += (sample_weights_for(labels, class_weights),)
+    window_shape = tuple(windows.shape[1:])
+    
+    def gather(batch_starts):
+        return np.asarray(windows[batch_starts], dtype=np.float32)
+    
+    def load_windows(batch_starts, *targets):
+        X = tf.numpy_function(gather, [batch_starts], tf.float32)
+        X.set_shape((None,) + window_shape)
+        return (X,) + targets
+    
+    ds = tf.data.Dataset.from_tensor_slices(columns)
+    if shuffle:
+        ds = ds.shuffle(min(shuffle_buffer, len(labels)), reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+    ds = ds.map(load_windows, num_parallel_calls=tf.data.AUTOTUNE)
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+def load_index_dataset(dataset_dir):
+    """
+    Load the index dataset written by build_sequences.py --format index.
+    Returns (features, splits, lookback); features is memory-mapped and
+    splits maps 'train'/'val' to (starts, labels).
+    """
+    with open(os.path.join(dataset_dir, 'meta.json')) as f:
+        meta = json.load(f)
+    features = np.load(os.path.join(dataset_dir, 'features.npy'), mmap_mode='r')
+    splits = {
+        split: (
+            np.load(os.path.join(dataset_dir, f'{split}_starts.npy')),
+            np.load(os.path.join(dataset_dir, f'{split}_labels.npy')),
+        )
+        for split in ('train', 'val')
+    }
+    return features, splits, meta['lookback']
+
+
+def class_weights_for(y_train):
+    """Balance Win/Loss recall: weight each class by total / (2 * count)."""
+    n_losses = (y_train == 0).sum()
+    n_wins = (y_train == 1).sum()
+    total = n_losses + n_wins
+    return {0: total / (2.0 * n_losses), 1: total / (2.0 * n_wins)}
+
+
+def build_model(input_shape, lstm_units=(64, 32), dense_units=16, dropout=0.4,
+                dense_dropout=0.2, l2_reg=0.001, learning_rate=LEARNING_RATE):
     """
     Build a Bidirectional LSTM with Attention for win probability prediction.
     
-    Architecture:
+    Architecture (defaults):
         BiLSTM(64) → BN → Dropout → BiLSTM(32) → BN → Dropout
         → Attention → Dense(16) → Dropout → Dense(1, sigmoid)
+    
+    One BiLSTM → BN → Dropout block is stacked per entry of lstm_units;
+    sweep.py searches over these arguments.
     """
     inputs = Input(shape=input_shape)
+    x = inputs
     
-    # BiLSTM Layer 1: 64 units per direction = 128 total
-    x = Bidirectional(
-        LSTM(64, return_sequences=True, kernel_regularizer=l2(0.001)),
-        merge_mode='concat'
-    )(inputs)
-    x = BatchNormalization()(x)
-    x = Dropout(0.4)(x)
-    
-    # BiLSTM Layer 2: 32 units per direction = 64 total
-    x = Bidirectional(
-        LSTM(32, return_sequences=True, kernel_regularizer=l2(0.001)),
-        merge_mode='concat'
-    )(x)
-    x = BatchNormalization()(x)
-    x = Dropout(0.4)(x)
+    # BiLSTM blocks: 64 then 32 units per direction = 128 / 64 total
+    for units in lstm_units:
+        x = Bidirectional(
+            LSTM(units, return_sequences=True, kernel_regularizer=l2(l2_reg)),
+            merge_mode='concat'
+        )(x)
+        x = BatchNormalization()(x)
+        x = Dropout(dropout)(x)
     
     # Attention: learn which games in the window matter most
     x = Attention(name='attention')(x)
     
     # Dense classifier head
-    x = Dense(16, activation='relu', kernel_regularizer=l2(0.001))(x)
-    x = Dropout(0.2)(x)
+    x = Dense(dense_units, activation='relu', kernel_regularizer=l2(l2_reg))(x)
+    x = Dropout(dense_dropout)(x)
     
     # Output: win probability
     outputs = Dense(1, activation='sigmoid')(x)
@@ -131,7 +256,7 @@ def build_model(input_shape):
     model = Model(inputs=inputs, outputs=outputs)
     
     model.compile(
-        optimizer=keras.optimizers.Adam(learning_rate=LEARNING_RATE),
+        optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
         loss='binary_crossentropy',
         metrics=['accuracy']
     )
@@ -145,6 +270,13 @@ def main():
                         help=f'Max training epochs (default: {DEFAULT_EPOCHS})')
     parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
                         help=f'Batch size (default: {BATCH_SIZE})')
+    parser.add_argument('--dataset', default=None,
+                        help='Index dataset directory (build_sequences.py --format index) '
+                             'instead of X_train/X_val .npy windows')
+    parser.add_argument('--stream', action='store_true',
+                        help='Feed training through a memory-mapped tf.data pipeline')
+    parser.add_argument('--shuffle-buffer', type=int, default=SHUFFLE_BUFFER,
+                        help=f'--stream shuffle buffer, in windows (default: {SHUFFLE_BUFFER})')
     args = parser.parse_args()
     
     print("=" * 60)
@@ -160,17 +292,30 @@ def main():
     
     # 1. Load data
     print("\n  Loading data...")
-    X_train = np.load('X_train.npy')
-    X_val = np.load('X_val.npy')
-    y_train = np.load('y_train.npy')
-    y_val = np.load('y_val.npy')
-    
-    print(f"  X_train: {X_train.shape}")
-    print(f"  X_val:   {X_val.shape}")
-    print(f"  y_train: {y_train.shape} (win rate: {y_train.mean():.3f})")
-    print(f"  y_val:   {y_val.shape} (win rate: {y_val.mean():.3f})")
-    
-    input_shape = (X_train.shape[1], X_train.shape[2])  # (10, 21)
+    if args.dataset:
+        features, splits, lookback = load_index_dataset(args.dataset)
+        (train_starts, y_train), (val_starts, y_val) = splits['train'], splits['val']
+        train_windows = val_windows = index_windows(features, lookback)
+        print(f"  Team-game matrix: {features.shape} (memory-mapped)")
+        print(f"  Train windows: {len(train_starts)} (win rate: {y_train.mean():.3f})")
+        print(f"  Val windows:   {len(val_starts)} (win rate: {y_val.mean():.3f})")
+        input_shape = (lookback, features.shape[1])
+    else:
+        # Streaming reads the windows straight from the memory-mapped files
+        mmap_mode = 'r' if args.stream else None
+        X_train = np.load('X_train.npy', mmap_mode=mmap_mode)
+        X_val = np.load('X_val.npy', mmap_mode=mmap_mode)
+        y_train = np.load('y_train.npy')
+        y_val = np.load('y_val.npy')
+        train_windows, train_starts = X_train, np.arange(len(X_train))
+        val_windows, val_starts = X_val, np.arange(len(X_val))
+        
+        print(f"  X_train: {X_train.shape}")
+        print(f"  X_val:   {X_val.shape}")
+        print(f"  y_train: {y_train.shape} (win rate: {y_train.mean():.3f})")
+        print(f"  y_val:   {y_val.shape} (win rate: {y_val.mean():.3f})")
+        
+        input_shape = (X_train.shape[1], X_train.shape[2])  # (10, 24)
     
     # 2. Build model
     print(f"\n  Building model with input shape {input_shape}...")
@@ -200,23 +345,41 @@ def main():
     print("-" * 60)
     
     # Compute class weights to balance Win/Loss recall
-    n_losses = (y_train == 0).sum()
-    n_wins = (y_train == 1).sum()
-    total = n_losses + n_wins
-    weight_loss = total / (2.0 * n_losses)
-    weight_win = total / (2.0 * n_wins)
-    class_weights = {0: weight_loss, 1: weight_win}
-    print(f"  Class weights: Loss={weight_loss:.3f}, Win={weight_win:.3f}")
-    
-    history = model.fit(
-        X_train, y_train,
-        validation_data=(X_val, y_val),
-        epochs=args.epochs,
-        batch_size=args.batch_size,
-        callbacks=callbacks,
-        class_weight=class_weights,
-        verbose=1
-    )
+    class_weights = class_weights_for(y_train)
+    print(f"  Class weights: Loss={class_weights[0]:.3f}, Win={class_weights[1]:.3f}")
+    
+    # Batched inputs: windows are assembled per batch and class weights ride
+    # along as sample weights. Validation batches keep their order.
+    val_data = None
+    if args.stream:
+        print(f"  Streaming via tf.data (shuffle buffer {args.shuffle_buffer}, AUTOTUNE prefetch)")
+        train_data = make_stream(train_windows, train_starts, y_train, args.batch_size,
+                                 class_weights=class_weights, shuffle=True,
+                                 shuffle_buffer=args.shuffle_buffer)
+        val_data = make_stream(val_windows, val_starts, y_val, args.batch_size)
+    elif args.dataset:
+        train_data = WindowSequence(train_windows, train_starts, y_train, args.batch_size,
+                                    class_weights=class_weights, shuffle=True)
+        val_data = WindowSequence(val_windows, val_starts, y_val, args.batch_size)
+    
+    if val_data is not None:
+        history = model.fit(
+            train_data,
+            validation_data=val_data,
+            epochs=args.epochs,
+            callbacks=callbacks,
+            verbose=1
+        )
+    else:
+        history = model.fit(
+            X_train, y_train,
+            validation_data=(X_val, y_val),
+            epochs=args.epochs,
+            batch_size=args.batch_size,
+            callbacks=callbacks,
+            class_weight=class_weights,
+            verbose=1
+        )
     
     # 5. Evaluate
     print("\n" + "=" * 60)
@@ -224,11 +387,17 @@ def main():
     print("=" * 60)
     
     # Validation predictions
-    y_pred_prob = model.predict(X_val, verbose=0).flatten()
+    if val_data is not None:
+        y_pred_prob = model.predict(val_data, verbose=0).flatten()
+    else:
+        y_pred_prob = model.predict(X_val, verbose=0).flatten()
     y_pred = (y_pred_prob >= 0.5).astype(int)
     
     # Metrics
-    val_loss, val_acc = model.evaluate(X_val, y_val, verbose=0)
+    if val_data is not None:
+        val_loss, val_acc = model.evaluate(val_data, verbose=0)
+    else:
+        val_loss, val_acc = model.evaluate(X_val, y_val, verbose=0)
     auc = roc_auc_score(y_val, y_pred_prob)
     
     print(f"\n  Validation Loss:     {val_loss:.4f}")
@@ -246,8 +415,18 @@ def main():
     model_path = os.path.join(MODELS_DIR, 'lstm_model.keras')
     model.save(model_path)
     
+    # Weights for the TensorFlow-free runtime used by predict_tonight.py,
+    # with the training scaler baked in so the two cannot drift apart
+    scaler_path = os.path.join(MODELS_DIR, SCALER_FILE)
+    scaler = joblib.load(scaler_path) if os.path.exists(scaler_path) else None
+    if scaler is None:
+        print(f"  [WARNING] {scaler_path} not found; exporting weights without the scaler")
+    weights_path = export_weights(model, os.path.join(MODELS_DIR, WEIGHTS_FILE), scaler)
+    
     print(f"\n  [SAVED] {model_path}")
-    print(f"  [NOTE] Copy models/lstm_model.keras and models/scaler.pkl to your local machine.")
+    print(f"  [SAVED] {weights_path}")
+    print(f"  [NOTE] Copy models/lstm_model.keras, models/{WEIGHTS_FILE} and "
+          f"models/scaler.pkl to your local machine.")
     
     # 7. Training summary
     best_epoch = np.argmin(history.history['val_loss']) + 1
@@ -0,0 +1,280 @@
+"""
+walk_forward.py — Walk-forward cross-validation of the BiLSTM+Attention model.
+
+One fold per season boundary: fold S trains on every window whose target game
+is in a season <= S and validates on the games of season S+1. Each fold fits
+its own StandardScaler on its training windows (weighted matrix rows, as in
+build_sequences.py --format index), and early-stops on the latest 10% of its
+training windows so the validation season is only ever scored once.
+
+Folds run concurrently in a process pool. Every worker pins TensorFlow to
+--threads intra-op threads (and one inter-op thread), so --workers x --threads
+can be matched to the core count instead of every process claiming all cores.
+The raw team-game matrix is shipped to each worker once, at startup.
+
+Every fold, training included, uses backtest.py's point-in-time
+missing_starter_minutes: the stored feature picks starters from full-season
+averages, which would leak the validation season's rest into its windows.
+
+Validation windows are paired into games and normalized home/away as in
+backtest.py, which also provides the metrics.
+
+Output (in walk_forward/):
+    folds.csv        per fold: seasons, window counts, epochs, game-level metrics
+    summary.csv      mean and std of every metric across folds, plus pooled
+    predictions.csv  out-of-fold game predictions of every fold
+
+Usage:
+    python walk_forward.py                          # one worker per 2 cores
+    python walk_forward.py --workers 4 --threads 2
+    python walk_forward.py --min-train-seasons 3 --epochs 30
+"""
+
+import pandas as pd
+import sqlite3
+import numpy as np
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from build_sequences import LOOKBACK, sliding_windows, window_row_weights
+from backtest import metrics, pair_games, point_in_time_team_games, point_in_time_windows
+from feature_store import load_team_games
+from predict_tonight import DB_NAME
+
+# CONFIG
+OUTPUT_DIR = "walk_forward"
+THREADS_PER_WORKER = 2
+EARLY_STOP_FRACTION = 0.1  # Latest share of each fold's training windows held out for early stopping
+EPOCHS = 50
+BATCH_SIZE = 32
+SEED = 42
+
+# Set in each worker by init_worker()
+_features = None
+
+
+def season_label(season_id):
+    """'2025-26' from SEASON_ID '22025'."""
+    year = int(str(season_id)[1:])
+    return f"{year}-{str(year + 1)[-2:]}"
+
+
+def make_folds(targets, min_train_seasons=1):
+    """
+    Walk-forward folds over the seasons of `targets` (from
+    point_in_time_windows). Returns a list of dicts with the train season,
+    validation season and the window positions of each split; the early-stop
+    split is the latest EARLY_STOP_FRACTION of training windows by game date.
+    """
+    seasons = sorted(targets['season_id'].astype(str).unique())
+    season = targets['season_id'].astype(str).to_numpy()
+    dates = targets['game_date'].to_numpy()
+    
+    folds = []
+    for k in range(min_train_seasons - 1, len(seasons) - 1):
+        train = np.flatnonzero(season <= seasons[k])
+        val = np.flatnonzero(season == seasons[k + 1])
+        cutoff = np.quantile(dates[train].astype('int64'), 1 - EARLY_STOP_FRACTION)
+        late = dates[train].astype('int64') >= cutoff
+        folds.append({
+            'fold': len(folds),
+            'train_season': seasons[k],
+            'val_season': seasons[k + 1],
+            'fit': train[~late],
+            'stop': train[late],
+            'val': val,
+        })
+    return folds
+
+
+def bound_tf_threads(threads):
+    """Limit TensorFlow (and OpenMP) to `threads` intra-op threads and one inter-op thread."""
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def init_worker(feature_matrix, threads):
+    """Pool initializer: keep the raw matrix and bound TensorFlow's thread pools."""
+    global _features
+    _features = feature_matrix
+    bound_tf_threads(threads)
+
+
+def train_fold(fold, starts, labels, epochs=EPOCHS, batch_size=BATCH_SIZE, lookback=LOOKBACK):
+    """
+    Fit the fold's scaler and model and score its validation windows.
+    Runs in a worker; `starts`/`labels` cover every window, indexed by the
+    fold's positions. Returns (fold number, raw validation probabilities,
+    epochs run, best early-stop loss).
+    """
+    from sklearn.preprocessing import StandardScaler
+    from tensorflow import keras
+    from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
+    from train_lstm import WindowSequence, build_model, class_weights_for
+    
+    keras.utils.set_random_seed(SEED + fold['fold'])
+    
+    # Scaler from this fold's training windows only
+    fit_starts, fit_labels = starts[fold['fit']], labels[fold['fit']]
+    weights = window_row_weights(np.concatenate([fit_starts, starts[fold['stop']]]),
+                                 len(_features), lookback)
+    used = weights > 0
+    scaler = StandardScaler()
+    scaler.fit(_features[used], sample_weight=weights[used])
+    features = np.nan_to_num(
+        scaler.transform(_features), nan=0.0, posinf=0.0, neginf=0.0
+    ).astype(np.float32)
+    windows = sliding_windows(features, lookback)
+    
+    train_data = WindowSequence(windows, fit_starts, fit_labels, batch_size,
+                                class_weights=class_weights_for(fit_labels), shuffle=True)
+    stop_data = WindowSequence(windows, starts[fold['stop']], labels[fold['stop']], batch_size)
+    
+    model = build_model(windows.shape[1:])
+    history = model.fit(
+        train_data,
+        validation_data=stop_data,
+        epochs=epochs,
+        callbacks=[
+            EarlyStopping(monitor='val_loss', patience=10, restore_best_weights=True),
+            ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=5, min_lr=1e-6),
+        ],
+        verbose=0
+    )
+    
+    val_starts = starts[fold['val']]
+    probs = np.concatenate([
+        model.predict(windows[val_starts[i:i + 4096]], verbose=0).ravel()
+        for i in range(0, len(val_starts), 4096)
+    ])
+    return fold['fold'], probs, len(history.history['loss']), min(history.history['val_loss'])
+
+
+def run_folds(folds, feature_matrix, starts, labels, workers, threads, epochs, batch_size):
+    """Train every fold, serially or across `workers` processes; results in fold order."""
+    jobs = [(fold, starts, labels, epochs, batch_size) for fold in folds]
+    
+    if workers <= 1 or len(folds) <= 1:
+        init_worker(feature_matrix, threads)
+        results = []
+        for job in jobs:
+            results.append(train_fold(*job))
+            print(f"  Fold {results[-1][0]} done ({results[-1][2]} epochs)")
+        return results
+    
+    workers = min(workers, len(folds))
+    print(f"  Training {len(folds)} folds across {workers} worker processes "
+          f"({threads} TF threads each)...")
+    # spawn: workers must not inherit a forked TensorFlow/OpenMP runtime
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                             initializer=init_worker, initargs=(feature_matrix, threads)) as pool:
+        futures = [pool.submit(train_fold, *job) for job in jobs]
+        results = []
+        for future in futures:
+            results.append(future.result())
+            print(f"  Fold {results[-1][0]} done ({results[-1][2]} epochs)")
+    return results
+
+
+def summarize_folds(fold_table, games):
+    """Mean and std of each metric across folds, and the metrics of all out-of-fold games."""
+    metric_names = ['accuracy', 'log_loss', 'brier', 'auc', 'ece']
+    rows = [
+        {'stat': 'mean', **fold_table[metric_names].mean().to_dict()},
+        {'stat': 'std', **fold_table[metric_names].std(ddof=0).to_dict()},
+    ]
+    pooled = metrics(games['home_win'], games['home_win_prob'])
+    rows.append({'stat': 'pooled', **{m: pooled[m] for m in metric_names}})
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Walk-forward (season-by-season) cross-validation')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Fold processes (default: cores / --threads)')
+    parser.add_argument('--threads', type=int, default=THREADS_PER_WORKER,
+                        help=f'TensorFlow threads per worker (default: {THREADS_PER_WORKER})')
+    parser.add_argument('--min-train-seasons', type=int, default=1,
+                        help='Seasons in the first fold\'s training set (default: 1)')
+    parser.add_argument('--epochs', type=int, default=EPOCHS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    if args.min_train_seasons < 1:
+        parser.error('--min-train-seasons must be at least 1')
+    
+    workers = args.workers or max(1, (os.cpu_count() or 1) // args.threads)
+    
+    print("=" * 60)
+    print("  WALK-FORWARD CROSS-VALIDATION")
+    print("=" * 60)
+    start_time = time.perf_counter()
+    
+    # 1. Team-game features and every point-in-time window
+    conn = sqlite3.connect(DB_NAME)
+    team_games = load_team_games(conn)
+    if team_games is None or team_games.empty:
+        conn.close()
+        print("[FAIL] No team_games table. Run feature_store.py first.")
+        return
+    team_games = point_in_time_team_games(conn, team_games)
+    conn.close()
+    
+    feature_matrix, starts, targets = point_in_time_windows(team_games)
+    labels = targets['win'].to_numpy(dtype=np.float32)
+    
+    # 2. One fold per season boundary
+    folds = make_folds(targets, args.min_train_seasons)
+    if not folds:
+        print(f"[FAIL] Need more than {args.min_train_seasons} season(s) of windows for a fold.")
+        return
+    for fold in folds:
+        print(f"  Fold {fold['fold']}: train <= {season_label(fold['train_season'])} "
+              f"({len(fold['fit'])} + {len(fold['stop'])} early-stop windows), "
+              f"validate {season_label(fold['val_season'])} ({len(fold['val'])} windows)")
+    
+    # 3. Train and score every fold
+    results = run_folds(folds, feature_matrix, starts, labels, workers, args.threads,
+                        args.epochs, args.batch_size)
+    
+    # 4. Game-level metrics per fold and across folds
+    fold_rows = []
+    fold_games = []
+    for fold, (_, probs, epochs_run, stop_loss) in zip(folds, results):
+        games = pair_games(targets.iloc[fold['val']].reset_index(drop=True), probs)
+        games.insert(0, 'fold', fold['fold'])
+        fold_games.append(games)
+        fold_rows.append({
+            'fold': fold['fold'],
+            'train_through': season_label(fold['train_season']),
+            'val_season': season_label(fold['val_season']),
+            'train_windows': len(fold['fit']) + len(fold['stop']),
+            'epochs': epochs_run,
+            'early_stop_loss': stop_loss,
+            **metrics(games['home_win'], games['home_win_prob']),
+        })
+    
+    fold_table = pd.DataFrame(fold_rows)
+    games = pd.concat(fold_games, ignore_index=True)
+    summary = summarize_folds(fold_table, games)
+    
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    for name, frame in [('folds', fold_table), ('summary', summary), ('predictions', games)]:
+        path = os.path.join(OUTPUT_DIR, f"{name}.csv")
+        frame.to_csv(path, index=False, float_format='%.4f')
+        print(f"  [SAVED] {path}")
+    
+    print(f"\n  {len(folds)} folds in {time.perf_counter() - start_time:.1f}s")
+    print(fold_table.drop(columns=['early_stop_loss']).to_string(
+        index=False, float_format=lambda x: f"{x:.3f}"))
+    print()
+    print(summary.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+
+
+if __name__ == "__main__":
+    main()